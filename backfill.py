@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Regenerates TASC (products 190/191) or sfcobs (product 6) frames over a time range in a process pool
+# Created 16 October 2026
+
+from os import path, cpu_count
+from datetime import datetime as dt, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import tempfile
+import traceback
+import argparse
+import matplotlib
+matplotlib.use("agg")
+import positionStore
+import basemapCache
+import mrmsCache
+
+basePath = path.dirname(path.abspath(__file__))
+goesDatasetsByDay = {}
+
+def renderTascFrame(frameTime, shouldGIS, tiles=False):
+    # A failed frame is logged and skipped, it shouldn't take the rest of the range down with it
+    import tascPlot
+    from matplotlib import pyplot as plt
+    try:
+        # Only the history up to the frame being drawn, so the trail looks like it did live
+        tascLoc = positionStore.readDataFrame(start=frameTime - positionStore.maxAge, end=frameTime)
+        return tascPlot.renderFrame(tascLoc, tascLoc.index[-1], shouldGIS, now=frameTime, mrmsTime=frameTime, writeMetadata=False, tiles=tiles)
+    except Exception:
+        print(f"Failed to render TASC frame {frameTime:%Y%m%d%H%M}:\n{traceback.format_exc()}")
+        plt.close("all")
+        return []
+
+def renderSfcobsFrame(day, datasetName):
+    import surface_analysis
+    from matplotlib import pyplot as plt
+    try:
+        if day not in goesDatasetsByDay:
+            goesDatasetsByDay[day] = surface_analysis.findGOESDatasets(day)
+        return surface_analysis.renderFrame(goesDatasetsByDay[day][datasetName], writeMetadata=False)
+    except Exception:
+        print(f"Failed to render sfcobs frame {datasetName}:\n{traceback.format_exc()}")
+        plt.close("all")
+        return []
+
+def warmSharedInputs(frameTimes, product, radarDir):
+    # Loaded once in the parent so forked workers inherit it copy-on-write instead of each fetching/decoding it.
+    # The GRIBs go in their own directory, the live renderers prune radarInput/ down to the newest few
+    mrmsCache.inputPath = radarDir
+    mrmsCache.maxGribsPerProduct = max(mrmsCache.maxGribsPerProduct, len(frameTimes))
+    mrmsCache.listingTTL = float("inf")
+    gribList = mrmsCache.listProduct(product)
+    for frameTime in frameTimes:
+        closestIdx = mrmsCache.closestScan(gribList, frameTime)
+        if closestIdx is not None:
+            mrmsCache.fetchGrib(product, gribList.iloc[closestIdx])
+
+def warmCropWindow(dataAvail):
+    # The fixed grid lat/lons are computed once here rather than by every worker at the same time
+    import surface_analysis
+    import goesGridCache
+    try:
+        goesGridCache.getCropWindow(dataAvail.remote_access(use_xarray=True), "Sectorized_CMI", surface_analysis.axExtent)
+    except Exception as e:
+        print(f"Failed to warm the GOES crop window, workers will compute it: {e}")
+
+def firstPerMinute(frameTimes):
+    # Frames are named HHMM, the live daemon only renders the first fix of each minute
+    minutesSeen = set()
+    firstTimes = []
+    for frameTime in sorted(frameTimes):
+        minute = frameTime.replace(second=0, microsecond=0)
+        if minute not in minutesSeen:
+            minutesSeen.add(minute)
+            firstTimes.append(frameTime)
+    return firstTimes
+
+def backfillTasc(start, end, shouldGIS=True, workers=None, tiles=False):
+    import tascPlot
+    frameTimes = firstPerMinute(positionStore.readDataFrame(start=start, end=end).index.to_pydatetime())
+    if len(frameTimes) == 0:
+        return
+    for layerName in basemapCache.layerSources.keys():
+        basemapCache.loadLayer(layerName)
+    with tempfile.TemporaryDirectory(prefix="backfillRadar-", dir=basePath) as radarDir:
+        warmSharedInputs(frameTimes, "ReflectivityAtLowestAltitude", radarDir)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            for metadataFrames in executor.map(renderTascFrame, frameTimes, [shouldGIS]*len(frameTimes), [tiles]*len(frameTimes)):
+                # Metadata JSON is appended to per-run files, so it's written here one frame at a time
+                tascPlot.writeMetadataFrames(metadataFrames)
+
+def backfillSfcobs(start, end, workers=None):
+    import surface_analysis
+    frames = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end:
+        goesDatasetsByDay[day] = surface_analysis.findGOESDatasets(day)
+        for datasetName in goesDatasetsByDay[day]:
+            scanTime = surface_analysis.goesScanTime(goesDatasetsByDay[day][datasetName])
+            if start <= scanTime <= end:
+                frames.append((scanTime, day, datasetName))
+        day = day + timedelta(days=1)
+    if len(frames) == 0:
+        return
+    frames = sorted(frames)
+    warmCropWindow(goesDatasetsByDay[frames[0][1]][frames[0][2]])
+    with tempfile.TemporaryDirectory(prefix="backfillRadar-", dir=basePath) as radarDir:
+        warmSharedInputs([frame[0] for frame in frames], "ReflectivityAtLowestAltitude", radarDir)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            for metadataFrames in executor.map(renderSfcobsFrame, [frame[1] for frame in frames], [frame[2] for frame in frames]):
+                surface_analysis.writeMetadataFrames(metadataFrames)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-render frames between two UTC times")
+    parser.add_argument("product", choices=["tasc", "sfcobs"])
+    parser.add_argument("start", help="UTC start time, YYYYmmddHHMM")
+    parser.add_argument("end", help="UTC end time, YYYYmmddHHMM")
+    parser.add_argument("--workers", type=int, default=cpu_count())
+    parser.add_argument("--no-gis", action="store_true")
+    parser.add_argument("--tiles", action="store_true", help="write TASC GIS output as XYZ tiles instead of full-frame PNGs")
+    args = parser.parse_args()
+    start = dt.strptime(args.start, "%Y%m%d%H%M")
+    end = dt.strptime(args.end, "%Y%m%d%H%M")
+    if args.product == "tasc":
+        # readRange excludes its start time, step back so a fix exactly at start is included
+        backfillTasc(start - timedelta(microseconds=1), end, not args.no_gis, args.workers, args.tiles)
+    else:
+        backfillSfcobs(start, end, args.workers)
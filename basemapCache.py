@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Pre-projected, tiled cache of the static TASC basemap layers
+# Created 16 October 2026
+
+from os import path, replace
+from pathlib import Path
+from collections import OrderedDict
+import math
+import pickle
+from cartopy import crs as ccrs
+from cartopy import feature as cfeat
+from metpy import plots as mpplots
+import shapely
+
+basePath = path.dirname(path.abspath(__file__))
+cachePath = path.join(basePath, "basemapCache")
+# Tiles are square in EPSG:3857 meters, roughly 1 degree at TASC latitudes
+tileSize = 100000
+maxCachedTiles = 256
+# Turned off by the offline benchmarks when the layers haven't been downloaded
+enabled = True
+
+layerSources = {
+    "roads" : lambda: cfeat.NaturalEarthFeature("cultural", "roads_north_america", "10m", facecolor="none"),
+    "counties" : lambda: mpplots.USCOUNTIES.with_scale("5m")
+}
+layerStyles = {
+    "roads" : {"edgecolor" : "red", "linewidth" : 0.25, "zorder" : 3},
+    "counties" : {"edgecolor" : "green", "linewidth" : 0.25, "zorder" : 2}
+}
+
+loadedLayers = {}
+tileCache = OrderedDict()
+
+def buildLayer(layerName):
+    # Project every geometry to web mercator once, drawing only needs the outlines so polygons become boundaries
+    feature = layerSources[layerName]()
+    webMercator = ccrs.epsg(3857)
+    projectedGeoms = []
+    for geom in feature.geometries():
+        if geom.geom_type in ["Polygon", "MultiPolygon"]:
+            geom = geom.boundary
+        projected = webMercator.project_geometry(geom, feature.crs)
+        if not projected.is_empty:
+            projectedGeoms.append(projected)
+    return projectedGeoms
+
+def loadLayer(layerName):
+    if layerName in loadedLayers:
+        return loadedLayers[layerName]
+    layerPath = path.join(cachePath, f"{layerName}.pkl")
+    if path.exists(layerPath):
+        with open(layerPath, "rb") as f:
+            geoms = pickle.load(f)
+    else:
+        geoms = buildLayer(layerName)
+        Path(cachePath).mkdir(parents=True, exist_ok=True)
+        with open(layerPath + ".tmp", "wb") as f:
+            pickle.dump(geoms, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(layerPath + ".tmp", layerPath)
+    loadedLayers[layerName] = (geoms, shapely.STRtree(geoms))
+    return loadedLayers[layerName]
+
+def getTile(layerName, tileX, tileY):
+    key = (layerName, tileX, tileY)
+    if key in tileCache:
+        tileCache.move_to_end(key)
+        return tileCache[key]
+    geoms, tree = loadLayer(layerName)
+    xmin, ymin = tileX * tileSize, tileY * tileSize
+    xmax, ymax = xmin + tileSize, ymin + tileSize
+    candidates = tree.query(shapely.box(xmin, ymin, xmax, ymax))
+    clipped = [shapely.clip_by_rect(geoms[idx], xmin, ymin, xmax, ymax) for idx in candidates]
+    clipped = [geom for geom in clipped if not geom.is_empty]
+    tileCache[key] = clipped
+    if len(tileCache) > maxCachedTiles:
+        tileCache.popitem(last=False)
+    return clipped
+
+def geometriesInExtent(layerName, extent):
+    # extent is [xmin, xmax, ymin, ymax] in EPSG:3857 meters
+    geomsInExtent = []
+    for tileX in range(math.floor(extent[0] / tileSize), math.floor(extent[1] / tileSize) + 1):
+        for tileY in range(math.floor(extent[2] / tileSize), math.floor(extent[3] / tileSize) + 1):
+            geomsInExtent.extend(getTile(layerName, tileX, tileY))
+    return geomsInExtent
+
+def addBasemapToAx(ax, layers=("roads", "counties")):
+    # ax must already have its final extent and figure size set
+    if not enabled:
+        return
+    ax.apply_aspect()
+    extent = ax.get_extent(crs=ccrs.epsg(3857))
+    for layerName in layers:
+        geoms = geometriesInExtent(layerName, extent)
+        if len(geoms) > 0:
+            ax.add_geometries(geoms, crs=ccrs.epsg(3857), facecolor="none", **layerStyles[layerName])
+
+
+if __name__ == "__main__":
+    # Prebuild the on-disk layer cache so the first rendered frame doesn't pay for it
+    for layerName in layerSources.keys():
+        loadLayer(layerName)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Generates the binary benchmark fixtures (small MRMS GRIB2 and GOES CONUS subset) that aren't checked in
+# Created 16 October 2026
+
+from os import path
+from pathlib import Path
+from datetime import datetime as dt
+import gzip
+import numpy as np
+import xarray as xr
+import eccodes
+
+fixturesPath = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+generatedPath = path.join(fixturesPath, "generated")
+fixtureTime = dt(2024, 5, 23, 18, 0, 0)
+goesDatasetName = "OR_ABI-L2-CMIPC-M6C02_G16_s20241441801170_e20241441803543_c20241441804022.nc"
+
+def smoothField(shape, seed, scale):
+    # Sum of a few random waves, reproducible and cheap to compress like real fields
+    rng = np.random.default_rng(seed)
+    rows, cols = np.meshgrid(np.linspace(0, 1, shape[0]), np.linspace(0, 1, shape[1]), indexing="ij")
+    field = np.zeros(shape, dtype=np.float32)
+    for _ in range(6):
+        freqRow, freqCol, phase = rng.uniform(1, 8), rng.uniform(1, 8), rng.uniform(0, 2*np.pi)
+        field += np.sin(2*np.pi*(freqRow*rows + freqCol*cols) + phase).astype(np.float32)
+    return (field - field.min()) / (field.max() - field.min()) * scale
+
+def makeMRMS():
+    # 0.02 degree reflectivity grid over Texas/Oklahoma, discipline 209 is MRMS-local so cfgrib names it "unknown" like the real thing
+    outputDir = path.join(generatedPath, "mrms", "ReflectivityAtLowestAltitude")
+    Path(outputDir).mkdir(parents=True, exist_ok=True)
+    lats = np.arange(36, 25, -0.02)
+    lons = np.arange(255, 272, 0.02)
+    values = smoothField((len(lats), len(lons)), 0, 90) - 20
+    gid = eccodes.codes_grib_new_from_samples("regular_ll_sfc_grib2")
+    eccodes.codes_set(gid, "discipline", 209)
+    eccodes.codes_set(gid, "parameterCategory", 3)
+    eccodes.codes_set(gid, "parameterNumber", 0)
+    eccodes.codes_set(gid, "dataDate", int(fixtureTime.strftime("%Y%m%d")))
+    eccodes.codes_set(gid, "dataTime", int(fixtureTime.strftime("%H%M")))
+    eccodes.codes_set(gid, "Ni", len(lons))
+    eccodes.codes_set(gid, "Nj", len(lats))
+    eccodes.codes_set(gid, "latitudeOfFirstGridPointInDegrees", float(lats[0]))
+    eccodes.codes_set(gid, "longitudeOfFirstGridPointInDegrees", float(lons[0]))
+    eccodes.codes_set(gid, "latitudeOfLastGridPointInDegrees", float(lats[-1]))
+    eccodes.codes_set(gid, "longitudeOfLastGridPointInDegrees", float(lons[-1]))
+    eccodes.codes_set(gid, "iDirectionIncrementInDegrees", 0.02)
+    eccodes.codes_set(gid, "jDirectionIncrementInDegrees", 0.02)
+    eccodes.codes_set(gid, "jScansPositively", 0)
+    eccodes.codes_set_values(gid, values.ravel().astype(np.float64))
+    with gzip.open(path.join(outputDir, fixtureTime.strftime("MRMS_ReflectivityAtLowestAltitude_00.50_%Y%m%d-%H%M%S.grib2.gz")), "wb") as f:
+        eccodes.codes_write(gid, f)
+    eccodes.codes_release(gid)
+
+def makeGOES():
+    # 0.5 km fixed grid subset of the CONUS sector over central Texas
+    x = np.arange(-0.066, -0.040, 0.000056)
+    y = np.arange(0.096, 0.080, -0.000056)
+    radiance = smoothField((len(y), len(x)), 1, 600)
+    dataset = xr.Dataset(
+        {
+            "Sectorized_CMI" : (("y", "x"), radiance, {"grid_mapping" : "fixedgrid_projection", "units" : "mW m-2 sr-1 (cm-1)-1"}),
+            "fixedgrid_projection" : ((), np.int32(0), {"grid_mapping_name" : "geostationary", "perspective_point_height" : 35786023.0,
+                                                        "semi_major_axis" : 6378137.0, "semi_minor_axis" : 6356752.31414,
+                                                        "longitude_of_projection_origin" : -75.0, "latitude_of_projection_origin" : 0.0,
+                                                        "sweep_angle_axis" : "x"})
+        },
+        coords={
+            "x" : ("x", x, {"units" : "rad", "axis" : "X", "standard_name" : "projection_x_coordinate"}),
+            "y" : ("y", y, {"units" : "rad", "axis" : "Y", "standard_name" : "projection_y_coordinate"}),
+            "time" : np.datetime64(fixtureTime, "ns")
+        }
+    )
+    Path(generatedPath).mkdir(parents=True, exist_ok=True)
+    dataset.to_netcdf(path.join(generatedPath, goesDatasetName))
+
+
+if __name__ == "__main__":
+    makeMRMS()
+    makeGOES()
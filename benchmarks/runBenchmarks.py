@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Offline benchmarks of the TASC and sfcobs pipelines against synthetic fixtures
+# Created 16 October 2026
+
+from os import path, environ
+import sys
+import tempfile
+import argparse
+from datetime import datetime
+environ.setdefault("HDWX_PERF_LOG", "-")
+benchPath = path.dirname(path.abspath(__file__))
+sys.path.insert(0, path.dirname(benchPath))
+import matplotlib
+matplotlib.use("agg")
+from matplotlib import pyplot as plt
+import xarray as xr
+import perfLog
+import positionStore
+import basemapCache
+import mrmsCache
+import goesGridCache
+import retention
+
+fixturesPath = path.join(benchPath, "fixtures")
+generatedPath = path.join(fixturesPath, "generated")
+goesDatasetName = "OR_ABI-L2-CMIPC-M6C02_G16_s20241441801170_e20241441803543_c20241441804022.nc"
+sfcobsExtent = [-99, -93, 29, 33]
+metarFixtureTime = datetime(2024, 5, 23, 18, 0)
+benchmarks = {}
+
+def benchmark(benchFunc):
+    benchmarks[benchFunc.__name__] = benchFunc
+    return benchFunc
+
+class LocalGOESDataset:
+    # Stands in for a siphon catalog dataset
+    def __init__(self, datasetPath):
+        self.datasetPath = datasetPath
+        self.name = path.basename(datasetPath)
+    def remote_access(self, use_xarray=True):
+        return xr.open_dataset(self.datasetPath)
+
+def useLocalMRMS(workDir):
+    mrmsCache.sourceURL = path.join(generatedPath, "mrms")
+    mrmsCache.inputPath = path.join(workDir, "radarInput")
+
+@benchmark
+def positionStore_appendRead(workDir):
+    storePath = path.join(workDir, "tascLoc.bin")
+    with perfLog.stage("importCSV"):
+        positionStore.importCSV(path.join(fixturesPath, "tascLoc.csv"), storePath)
+    history = positionStore.readDataFrame(storePath=storePath)
+    with perfLog.stage("appendOne"):
+        positionStore.append(history.iloc[-1:].set_axis(history.index[-1:] + (history.index[-1] - history.index[-2])), storePath)
+    with perfLog.stage("readRange"):
+        lastTime = positionStore.lastTime(storePath)
+        positionStore.readDataFrame(start=lastTime - (history.index[-1] - history.index[0])/4, storePath=storePath)
+    perfLog.emit("benchmark:positionStore_appendRead")
+
+@benchmark
+def tascPlot_frame(workDir):
+    import tascPlot
+    storePath = path.join(workDir, "tascLoc.bin")
+    if not path.exists(storePath):
+        positionStore.importCSV(path.join(fixturesPath, "tascLoc.csv"), storePath)
+    useLocalMRMS(workDir)
+    tascPlot.basePath = workDir
+    if not all(path.exists(path.join(basemapCache.cachePath, f"{layerName}.pkl")) for layerName in basemapCache.layerSources.keys()):
+        # Building the basemap cache needs the Natural Earth/MetPy downloads, prebuild it with basemapCache.py to include it
+        print("basemap cache not built, skipping basemap layers", file=sys.stderr)
+        basemapCache.enabled = False
+    tascLoc = positionStore.readDataFrame(storePath=storePath)
+    lastTime = tascLoc.index[-1]
+    tascPlot.renderFrame(tascLoc, lastTime, True, now=lastTime, mrmsTime=lastTime, writeMetadata=False)
+
+@benchmark
+def surface_analysis_satellite(workDir):
+    import surface_analysis
+    useLocalMRMS(workDir)
+    goesGridCache.cachePath = path.join(workDir, "goesGridCache")
+    surface_analysis.axExtent = sfcobsExtent
+    fig, ax, validTime = surface_analysis.plotSat(LocalGOESDataset(path.join(generatedPath, goesDatasetName)))
+    ax.set_extent(sfcobsExtent)
+    with perfLog.stage("mrms"):
+        surface_analysis.addMRMSToFig(ax, validTime)
+    with perfLog.stage("saveImage"):
+        fig.set_size_inches(3840/fig.dpi, 2160/fig.dpi)
+        fig.savefig(path.join(workDir, "sfcobs.png"))
+    plt.close(fig)
+    perfLog.emit("benchmark:surface_analysis_satellite")
+
+@benchmark
+def metar_stationTable(workDir):
+    # First iteration parses the fixture bulletin, later ones hit the hourly cache
+    import shutil
+    import metarCache
+    metarCache.cachePath = path.join(workDir, "metarCache")
+    metarCache.downloadBulletin = lambda metarTime: shutil.copy(path.join(fixturesPath, "metar_20240523_1800.txt"), path.join(workDir, "metar_20240523_1800.txt"))
+    metarCache.loadedTables.clear()
+    with perfLog.stage("stationTable"):
+        metarCache.getStationTable(metarFixtureTime)
+    perfLog.emit("benchmark:metar_stationTable")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run offline benchmarks, results are JSON lines (HDWX_PERF_LOG, stdout by default)")
+    parser.add_argument("names", nargs="*", default=list(benchmarks.keys()), help=", ".join(benchmarks.keys()))
+    parser.add_argument("--repeat", type=int, default=3, help="the first iteration of each benchmark runs with cold caches")
+    args = parser.parse_args()
+    if not path.exists(path.join(generatedPath, goesDatasetName)):
+        print("Binary fixtures missing, run benchmarks/makeFixtures.py first", file=sys.stderr)
+        exit(1)
+    # Frames written by the benchmarks shouldn't end up in the real retention manifest
+    manifestDir = tempfile.TemporaryDirectory()
+    retention.manifestPath = path.join(manifestDir.name, "retention.db")
+    for name in args.names:
+        with tempfile.TemporaryDirectory() as workDir:
+            for iteration in range(args.repeat):
+                perfLog.reset()
+                benchmarks[name](workDir)
@@ -3,29 +3,23 @@
 # Created on 31 May 2023 by Sam Gardner <stgardner4@tamu.edu>
 
 from datetime import datetime as dt, timedelta
-from os import path, walk, remove
+import argparse
+import positionStore
+import retention
 
 if __name__ == "__main__":
-    basePath = path.dirname(path.abspath(__file__))
-    now = dt.now()
-    outputPath = path.join(basePath, "output")
-    if path.exists(outputPath):
-        for root, dirs, files in walk(outputPath):
-            for name in files:
-                filepath = path.join(basePath, root, name)
-                if filepath.endswith(".json"):
-                    deleteAfter = timedelta(days=2)
-                else:
-                    deleteAfter = timedelta(minutes=20)
-                createTime = dt.fromtimestamp(path.getmtime(filepath))
-                if createTime < now - deleteAfter:
-                    remove(filepath)
-    tascLocPath = path.join(basePath, "tascLoc.csv")
-    if path.exists(tascLocPath):
-        with open(tascLocPath, "r") as f:
-            lines = f.readlines()
-        lastReport = lines[-1]
-        lastDateStr = lastReport.split(",")[0]
-        lastDate = dt.strptime(lastDateStr, "%Y-%m-%d %H:%M:%S")
-        if lastDate < now - timedelta(days=7):
-            remove(tascLocPath)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Delete expired output and trim the position store")
+    parser.add_argument("--full-scan", action="store_true", help="also walk all of output/ by mtime, for files the retention manifest doesn't know about")
+    args = parser.parse_args()
+    retention.sweep()
+    if args.full_scan:
+        retention.fullScan()
+    lastDate = positionStore.lastTime()
+    if lastDate is not None:
+        if lastDate < dt.utcnow() - timedelta(days=7):
+            positionStore.removeStore()
+        else:
+            # Rewriting the store takes its lock and races the fetchers, so only when there's something old to drop
+            firstDate = positionStore.firstTime()
+            if firstDate is not None and firstDate < dt.utcnow() - positionStore.maxAge:
+                positionStore.compact()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Atomic image and metadata output shared by the TASC and sfcobs renderers
+# Created 16 October 2026
+
+from os import path, replace, walk, getpid, stat
+from pathlib import Path
+from contextlib import contextmanager
+import fcntl
+import shutil
+import json
+import retention
+
+basePath = path.dirname(path.abspath(__file__))
+outputPath = path.join(basePath, "output")
+# Paths under output/ written since the last publish.py run, one per line
+publishListPath = path.join(basePath, "publishList.txt")
+if path.exists(path.join(basePath, "HDWX_helpers.py")):
+    import HDWX_helpers
+    hasHelpers = True
+else:
+    hasHelpers = False
+
+def recordOutput(pathToSave):
+    # Every finished output is registered for retention and queued for the next publish
+    retention.register(pathToSave)
+    relPath = path.relpath(path.abspath(pathToSave), outputPath)
+    if not relPath.startswith(".."):
+        # One short line per write, appends from backfill workers don't interleave
+        with open(publishListPath, "a") as f:
+            f.write(relPath + "\n")
+
+def saveImage(fig, pathToSave, **kwargs):
+    # Render next to the destination and rename over it so readers never see a partial PNG
+    Path(path.dirname(pathToSave)).mkdir(parents=True, exist_ok=True)
+    tmpPath = path.join(path.dirname(pathToSave), "." + path.basename(pathToSave).replace(".png", ".tmp.png"))
+    if hasHelpers:
+        HDWX_helpers.saveImage(fig, tmpPath, **kwargs)
+    else:
+        fig.savefig(tmpPath, **kwargs)
+    replace(tmpPath, pathToSave)
+    recordOutput(pathToSave)
+    return pathToSave
+
+def saveJson(data, pathToSave):
+    Path(path.dirname(pathToSave)).mkdir(parents=True, exist_ok=True)
+    tmpPath = path.join(path.dirname(pathToSave), "." + path.basename(pathToSave).replace(".json", ".tmp.json"))
+    with open(tmpPath, "w") as f:
+        json.dump(data, f)
+    replace(tmpPath, pathToSave)
+    recordOutput(pathToSave)
+    return pathToSave
+
+@contextmanager
+def lockedMetadata():
+    # Serializes writeJson across the daemon, surface_analysis and backfill so no writer's frames are dropped
+    with open(path.join(basePath, "metadata.lock"), "a") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+def writeMetadata(productID, runTime, fileName, validTime, gisInfo, reloadInterval):
+    # writeJson edits its JSON in place, so it's pointed at a private copy of the directories it touches
+    # and only the files it actually wrote are renamed over their live counterparts
+    if not hasHelpers:
+        return []
+    stagingPath = path.join(basePath, ".metadataStaging", str(getpid()))
+    stagedDirs = [path.join("output", "metadata", "products", str(productID)), path.join("output", "metadata", "productTypes")]
+    writtenPaths = []
+    with lockedMetadata():
+        shutil.rmtree(stagingPath, ignore_errors=True)
+        for stagedDir in stagedDirs:
+            if path.exists(path.join(basePath, stagedDir)):
+                shutil.copytree(path.join(basePath, stagedDir), path.join(stagingPath, stagedDir), copy_function=shutil.copy2)
+        stagedBefore = snapshotTree(stagingPath)
+        try:
+            HDWX_helpers.writeJson(stagingPath, productID, runTime=runTime, fileName=fileName, validTime=validTime, gisInfo=gisInfo, reloadInterval=reloadInterval)
+            for stagedPath, stagedStat in snapshotTree(stagingPath).items():
+                if stagedBefore.get(stagedPath) == stagedStat:
+                    continue
+                finalPath = path.join(basePath, path.relpath(stagedPath, stagingPath))
+                Path(path.dirname(finalPath)).mkdir(parents=True, exist_ok=True)
+                replace(stagedPath, finalPath)
+                recordOutput(finalPath)
+                writtenPaths.append(finalPath)
+        finally:
+            shutil.rmtree(stagingPath, ignore_errors=True)
+    return writtenPaths
+
+def snapshotTree(rootPath):
+    # {path : (mtime_ns, size)} of every file under rootPath
+    snapshot = {}
+    for root, dirs, files in walk(rootPath):
+        for name in files:
+            fileStat = stat(path.join(root, name))
+            snapshot[path.join(root, name)] = (fileStat.st_mtime_ns, fileStat.st_size)
+    return snapshot
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# XYZ web mercator tile output for the TASC GIS product
+# Created 16 October 2026
+
+from os import path
+import numpy as np
+from matplotlib.figure import Figure
+import frameOutput
+import perfLog
+
+tilePixels = 256
+zoomLevels = range(6, 12)
+# Half the width of the web mercator world in meters
+originShift = 20037508.342789244
+# Tiles within this many pixels of a drawn shape are rendered, covers the marker radius and line widths
+padPixels = 4
+tileFig = None
+tileAx = None
+
+def tileSpan(zoom):
+    return 2 * originShift / 2**zoom
+
+def tileBounds(zoom, col, row):
+    # Returns left, right, bottom, top in web mercator meters, rows count down from the north edge like XYZ/slippy maps
+    span = tileSpan(zoom)
+    left = -originShift + col * span
+    top = originShift - row * span
+    return left, left + span, top - span, top
+
+def tilesInFootprint(zoom, xMins, xMaxs, yMins, yMaxs):
+    # Set of (col, row) touched by any of the boxes, boxes are web mercator meters
+    span = tileSpan(zoom)
+    pad = padPixels * span / tilePixels
+    maxIdx = 2**zoom - 1
+    colStarts = np.clip(np.floor((np.asarray(xMins) - pad + originShift) / span), 0, maxIdx)
+    colEnds = np.clip(np.floor((np.asarray(xMaxs) + pad + originShift) / span), 0, maxIdx)
+    rowStarts = np.clip(np.floor((originShift - np.asarray(yMaxs) - pad) / span), 0, maxIdx)
+    rowEnds = np.clip(np.floor((originShift - np.asarray(yMins) + pad) / span), 0, maxIdx)
+    # Trail segments are tiny compared to a tile, so most boxes collapse onto a few unique tile ranges
+    tileRanges = np.unique(np.stack([colStarts, colEnds, rowStarts, rowEnds], axis=-1).astype(int).reshape(-1, 4), axis=0)
+    tiles = set()
+    for colStart, colEnd, rowStart, rowEnd in tileRanges:
+        for col in range(colStart, colEnd + 1):
+            for row in range(rowStart, rowEnd + 1):
+                tiles.add((col, row))
+    return tiles
+
+def getTileAxes():
+    # One 256px figure is reused for every tile of every frame, only the axes limits move between tiles.
+    # It's kept out of pyplot so it never becomes the current figure or gets closed by plt.close("all")
+    global tileFig, tileAx
+    if tileFig is None:
+        tileFig = Figure(figsize=(tilePixels/100, tilePixels/100), dpi=100)
+        tileAx = tileFig.add_axes([0, 0, 1, 1])
+    tileAx.cla()
+    tileAx.set_axis_off()
+    return tileFig, tileAx
+
+def renderTiles(fig, ax, footprint, outputDir):
+    # footprint is (xMins, xMaxs, yMins, yMaxs) of everything drawn on ax, returns {zoom: [[col, row], ...]} of the tiles written
+    writtenTiles = {}
+    for zoom in zoomLevels:
+        tiles = sorted(tilesInFootprint(zoom, *footprint))
+        for col, row in tiles:
+            left, right, bottom, top = tileBounds(zoom, col, row)
+            ax.set_xlim(left, right)
+            ax.set_ylim(bottom, top)
+            with perfLog.stage("tileSave"):
+                frameOutput.saveImage(fig, path.join(outputDir, str(zoom), str(col), f"{row}.png"), transparent=True)
+        writtenTiles[str(zoom)] = [[col, row] for col, row in tiles]
+    return writtenTiles
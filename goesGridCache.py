@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Persistent cache of GOES fixed grid lat/lons and the crop window for a plot extent
+# Created 16 October 2026
+
+from os import path, replace, getpid
+from pathlib import Path
+import hashlib
+import json
+import zipfile
+import numpy as np
+from cartopy import crs as ccrs
+
+basePath = path.dirname(path.abspath(__file__))
+cachePath = path.join(basePath, "goesGridCache")
+loadedWindows = {}
+# Fixed grid x/y are scan angles, scaled by the satellite height they become the projection coordinates cartopy expects
+unitScales = {"rad" : None, "radians" : None, "km" : 1000, "m" : 1}
+
+def gridKey(dataset, variable, axExtent):
+    # The fixed grid only changes if the projection, the sector coordinates or the requested extent change
+    projectionAttrs = dataset[dataset[variable].attrs["grid_mapping"]].attrs
+    xCoords = dataset[variable].x.values
+    yCoords = dataset[variable].y.values
+    keyInfo = {
+        "projection" : {key : str(value) for key, value in sorted(projectionAttrs.items())},
+        "x" : [float(xCoords[0]), float(xCoords[-1]), len(xCoords)],
+        "y" : [float(yCoords[0]), float(yCoords[-1]), len(yCoords)],
+        "extent" : [float(bound) for bound in axExtent]
+    }
+    return hashlib.sha1(json.dumps(keyInfo, sort_keys=True).encode()).hexdigest()
+
+def computeWindow(dataset, variable, axExtent):
+    # Only touches the coordinate variables, the channel data itself is never read here
+    gridWithLatLon = dataset.metpy.parse_cf(variable).metpy.assign_latitude_longitude()
+    lons = gridWithLatLon.longitude.values
+    lats = gridWithLatLon.latitude.values
+    inExtent = (lons >= axExtent[0]) & (lons <= axExtent[1]) & (lats >= axExtent[2]) & (lats <= axExtent[3])
+    rowsInExtent = np.flatnonzero(inExtent.any(axis=1))
+    colsInExtent = np.flatnonzero(inExtent.any(axis=0))
+    if len(rowsInExtent) == 0 or len(colsInExtent) == 0:
+        rowStart, rowStop, colStart, colStop = 0, 0, 0, 0
+    else:
+        rowStart, rowStop = rowsInExtent[0], rowsInExtent[-1] + 1
+        colStart, colStop = colsInExtent[0], colsInExtent[-1] + 1
+    return {
+        "bounds" : np.array([rowStart, rowStop, colStart, colStop]),
+        "lons" : lons[rowStart:rowStop, colStart:colStop].astype(np.float32),
+        "lats" : lats[rowStart:rowStop, colStart:colStop].astype(np.float32),
+        "inExtent" : inExtent[rowStart:rowStop, colStart:colStop]
+    }
+
+def getCropWindow(dataset, variable, axExtent):
+    # Returns the row/col slices of the extent's bounding box plus the lat/lon/in-extent arrays for that box
+    key = gridKey(dataset, variable, axExtent)
+    if key not in loadedWindows:
+        windowPath = path.join(cachePath, key + ".npz")
+        window = None
+        if path.exists(windowPath):
+            try:
+                with np.load(windowPath) as windowFile:
+                    window = {name : windowFile[name] for name in windowFile.files}
+            except (OSError, ValueError, EOFError, zipfile.BadZipFile) as e:
+                # A bad cache file is rebuilt and replaced below instead of failing every run
+                print(f"Discarding unreadable GOES crop window cache {windowPath}: {e}")
+        if window is None:
+            window = computeWindow(dataset, variable, axExtent)
+            Path(cachePath).mkdir(parents=True, exist_ok=True)
+            # Per-process tmp name so concurrent writers never rename each other's half-written file into place
+            tmpPath = f"{windowPath}.{getpid()}.tmp"
+            with open(tmpPath, "wb") as f:
+                np.savez(f, **window)
+            replace(tmpPath, windowPath)
+        loadedWindows[key] = window
+    window = loadedWindows[key]
+    rowStart, rowStop, colStart, colStop = [int(bound) for bound in window["bounds"]]
+    return slice(rowStart, rowStop), slice(colStart, colStop), window["lats"], window["lons"], window["inExtent"]
+
+def fixedGridAxes(dataset, variable):
+    # Returns the Geostationary CRS and the x/y coordinate vectors in its meters
+    projectionAttrs = dataset[dataset[variable].attrs["grid_mapping"]].attrs
+    height = float(projectionAttrs["perspective_point_height"])
+    globe = ccrs.Globe(semimajor_axis=float(projectionAttrs.get("semi_major_axis", 6378137.0)), semiminor_axis=float(projectionAttrs.get("semi_minor_axis", 6356752.31414)))
+    geos = ccrs.Geostationary(central_longitude=float(projectionAttrs["longitude_of_projection_origin"]), satellite_height=height, sweep_axis=projectionAttrs.get("sweep_angle_axis", "x"), globe=globe)
+    axes = []
+    for coordName in ["x", "y"]:
+        coord = dataset[variable][coordName]
+        scale = unitScales.get(coord.attrs.get("units", "rad"), None)
+        axes.append(coord.values.astype(np.float64) * (height if scale is None else scale))
+    return geos, axes[0], axes[1]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Hourly cache of decoded, airport-filtered METAR station tables for surface_analysis.py
+# Created 16 October 2026
+
+from os import path, listdir, remove, replace, getpid
+from pathlib import Path
+from datetime import datetime as dt, timedelta
+import pickle
+import numpy as np
+import pandas as pd
+from cartopy import crs as ccrs
+from metpy.io import parse_metar_file
+from metpy.cbook import get_test_data
+from metpy import calc as mpcalc
+from siphon.catalog import TDSCatalog
+import perfLog
+
+basePath = path.dirname(path.abspath(__file__))
+cachePath = path.join(basePath, "metarCache")
+metarCatalogURL = "https://thredds.ucar.edu/thredds/catalog/noaaport/text/metar/catalog.xml"
+requiredFields = ["longitude", "latitude", "station_id", "wind_speed", "wind_direction", "air_temperature", "dew_point_temperature", "air_pressure_at_sea_level", "current_wx1_symbol", "cloud_coverage"]
+# The current hour's bulletin keeps growing, its table is rebuilt once it's older than this
+refreshAfter = timedelta(minutes=20)
+maxCachedHours = 3
+airportIdents = None
+loadedTables = {}
+
+def getAirportIdents():
+    global airportIdents
+    if airportIdents is None:
+        identsPath = path.join(cachePath, "airportIdents.txt")
+        if path.exists(identsPath):
+            with open(identsPath, "r") as f:
+                airportIdents = frozenset(f.read().split())
+        else:
+            airports = pd.read_csv(get_test_data("airport-codes.csv"))
+            airports = airports[(airports["type"] == "large_airport") | (airports["type"] == "medium_airport") | (airports["type"] == "small_airport")]
+            airportIdents = frozenset(airports["ident"].dropna())
+            Path(cachePath).mkdir(parents=True, exist_ok=True)
+            tmpPath = f"{identsPath}.{getpid()}.tmp"
+            with open(tmpPath, "w") as f:
+                f.write("\n".join(sorted(airportIdents)))
+            replace(tmpPath, identsPath)
+    return airportIdents
+
+def downloadBulletin(metarTime):
+    # Per-process name, backfill workers building the same hour would otherwise remove each other's download
+    dataset = TDSCatalog(metarCatalogURL).datasets.filter_time_nearest(metarTime)
+    bulletinPath = path.join(cachePath, f"{dataset.name}.{getpid()}")
+    with perfLog.stage("metarDownload"):
+        dataset.download(bulletinPath)
+        perfLog.addBytes(path.getsize(bulletinPath))
+    return bulletinPath
+
+def buildStationTable(metarTime, reduceRadius):
+    bulletinPath = downloadBulletin(metarTime)
+    with perfLog.stage("metarParse"):
+        metarData = parse_metar_file(bulletinPath, year=metarTime.year, month=metarTime.month)
+    remove(bulletinPath)
+    metarUnits = metarData.units
+    stationTable = metarData[metarData["station_id"].isin(getAirportIdents())]
+    stationTable = stationTable.dropna(how="any", subset=requiredFields)
+    stationTable = stationTable.drop_duplicates(subset=["station_id"], keep="last").reset_index(drop=True)
+    locationsInMeters = ccrs.epsg(3857).transform_points(ccrs.PlateCarree(), stationTable["longitude"].values, stationTable["latitude"].values)
+    stationTable["x"] = locationsInMeters[:, 0]
+    stationTable["y"] = locationsInMeters[:, 1]
+    if len(stationTable) > 0:
+        stationTable["selected"] = mpcalc.reduce_point_density(locationsInMeters[:, 0:2], reduceRadius)
+    else:
+        stationTable["selected"] = np.zeros(0, dtype=bool)
+    return {"table" : stationTable, "units" : metarUnits, "built" : dt.utcnow(), "reduceRadius" : reduceRadius}
+
+def pruneCache(keepKey):
+    cachedTables = sorted([fileName for fileName in listdir(cachePath) if fileName.startswith("stations_") and fileName.endswith(".pkl")])
+    for oldTable in cachedTables[:-maxCachedHours]:
+        if oldTable != f"stations_{keepKey}.pkl":
+            remove(path.join(cachePath, oldTable))
+
+def getStationTable(validTime, reduceRadius=50000):
+    # Returns (DataFrame with x/y in EPSG:3857 and a reduce_point_density "selected" column, units dict)
+    metarTime = validTime.replace(minute=0, second=0, microsecond=0)
+    key = metarTime.strftime("%Y%m%d%H")
+    tablePath = path.join(cachePath, f"stations_{key}.pkl")
+    cached = loadedTables.get(key)
+    if cached is None and path.exists(tablePath):
+        with open(tablePath, "rb") as f:
+            cached = pickle.load(f)
+    isCurrentHour = metarTime >= dt.utcnow().replace(minute=0, second=0, microsecond=0)
+    if cached is None or cached["reduceRadius"] != reduceRadius or (isCurrentHour and dt.utcnow() - cached["built"] > refreshAfter):
+        Path(cachePath).mkdir(parents=True, exist_ok=True)
+        cached = buildStationTable(metarTime, reduceRadius)
+        tmpPath = f"{tablePath}.{getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(tmpPath, tablePath)
+        pruneCache(key)
+    loadedTables.clear()
+    loadedTables[key] = cached
+    return cached["table"], cached["units"]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Shared MRMS GRIB fetch/decode cache for tascPlot.py and surface_analysis.py
+# Created 16 October 2026
+
+from os import path, listdir, remove, replace, environ, getpid
+from pathlib import Path
+from collections import OrderedDict
+from datetime import datetime as dt, timedelta
+import gzip
+import time
+import re
+import shutil
+import numpy as np
+import pandas as pd
+import xarray as xr
+import requests
+import perfLog
+
+basePath = path.dirname(path.abspath(__file__))
+inputPath = path.join(basePath, "radarInput")
+# Either an http(s) URL laid out like the NCEP server or a local directory with one subdirectory per product
+sourceURL = environ.get("HDWX_MRMS_SOURCE", "https://mrms.ncep.noaa.gov/data/2D/")
+maxDecoded = 4
+maxSubsets = 16
+maxGribsPerProduct = 3
+# GRIBs newer than this many seconds are never pruned, another process may have just fetched one and not opened it yet
+pruneGrace = 300
+# Directory listings are reused for this many seconds
+listingTTL = 30
+# Scans further than this from the requested time aren't used, the frame gets no radar layer instead
+maxTimeOffset = timedelta(minutes=5)
+
+httpSession = requests.Session()
+listingCache = {}
+decodedCache = OrderedDict()
+subsetCache = OrderedDict()
+fileNameRegex = re.compile(r"^MRMS_(?P<product>.+)_\d\d\.\d\d_(?P<time>\d{8}-\d{6})\.grib2\.gz$")
+
+def isLocalSource():
+    return not sourceURL.startswith("http")
+
+def listProduct(product):
+    # Series of .grib2.gz file names indexed by valid time
+    if product in listingCache and (dt.now() - listingCache[product][0]).total_seconds() < listingTTL:
+        return listingCache[product][1]
+    if isLocalSource():
+        fileNames = listdir(path.join(sourceURL, product))
+    else:
+        with perfLog.stage("mrmsListing"):
+            fileNames = pd.read_html(sourceURL.rstrip("/") + "/" + product + "/")[0].dropna(how="any")["Name"]
+    gribList = {}
+    for fileName in fileNames:
+        match = fileNameRegex.match(fileName)
+        if match is not None and match.group("product") == product:
+            gribList[dt.strptime(match.group("time"), "%Y%m%d-%H%M%S")] = fileName
+    listingCache[product] = (dt.now(), pd.Series(gribList, dtype=object).sort_index())
+    return listingCache[product][1]
+
+def pruneGribs(product, keep):
+    gribsOnDisk = sorted([fileName for fileName in listdir(inputPath) if fileName.startswith(f"MRMS_{product}_") and fileName.endswith(".grib2")])
+    for oldGrib in gribsOnDisk[:-maxGribsPerProduct]:
+        if oldGrib == keep:
+            continue
+        try:
+            if time.time() - path.getmtime(path.join(inputPath, oldGrib)) > pruneGrace:
+                remove(path.join(inputPath, oldGrib))
+        except FileNotFoundError:
+            pass
+
+def fetchGrib(product, fileName):
+    # Decompress straight from the response stream to disk, shared across processes through radarInput/
+    Path(inputPath).mkdir(parents=True, exist_ok=True)
+    gribName = fileName.replace(".gz", "")
+    gribPath = path.join(inputPath, gribName)
+    if path.exists(gribPath):
+        return gribPath
+    with perfLog.stage("mrmsDownload"):
+        downloadGrib(product, fileName, gribPath)
+    pruneGribs(product, gribName)
+    return gribPath
+
+def downloadGrib(product, fileName, gribPath):
+    # Per-process tmp name, the daemon and surface_analysis can fetch the same scan at once
+    tmpPath = f"{gribPath}.{getpid()}.tmp"
+    if isLocalSource():
+        perfLog.addBytes(path.getsize(path.join(sourceURL, product, fileName)))
+        with gzip.open(path.join(sourceURL, product, fileName), "rb") as f_in:
+            with open(tmpPath, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+    else:
+        with httpSession.get(sourceURL.rstrip("/") + "/" + product + "/" + fileName, stream=True) as mrmsData:
+            mrmsData.raise_for_status()
+            with gzip.GzipFile(fileobj=mrmsData.raw) as f_in:
+                with open(tmpPath, "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            perfLog.addBytes(mrmsData.raw.tell())
+    replace(tmpPath, gribPath)
+
+def fetchLatest(product="ReflectivityAtLowestAltitude"):
+    gribList = listProduct(product)
+    return fetchGrib(product, gribList.iloc[-1]), gribList.index[-1]
+
+def closestScan(gribList, time):
+    # Index into gribList of the scan nearest to time, None if the listing has nothing within maxTimeOffset
+    if len(gribList) == 0:
+        return None
+    offsets = np.abs(gribList.index - pd.Timestamp(time).tz_localize(None))
+    closestIdx = int(np.argmin(offsets))
+    if offsets[closestIdx] > maxTimeOffset:
+        return None
+    return closestIdx
+
+def fetchClosestToTime(time, product="ReflectivityAtLowestAltitude"):
+    # Returns (None, None) when no scan is close enough to time
+    gribList = listProduct(product)
+    closestIdx = closestScan(gribList, time)
+    if closestIdx is None:
+        return None, None
+    return fetchGrib(product, gribList.iloc[closestIdx]), gribList.index[closestIdx]
+
+def openProduct(product, validTime, gribPath):
+    # Bounded LRU of fully decoded grids, cfgrib is told not to leave .idx files behind
+    key = (product, validTime)
+    if key in decodedCache:
+        decodedCache.move_to_end(key)
+        return decodedCache[key]
+    with perfLog.stage("mrmsDecode"):
+        radarDS = xr.open_dataset(gribPath, engine="cfgrib", backend_kwargs={"indexpath" : ""})
+        radarDS["unknown"] = radarDS.unknown.astype(np.float32)
+        radarDS = radarDS.load()
+    decodedCache[key] = radarDS
+    if len(decodedCache) > maxDecoded:
+        decodedCache.popitem(last=False)
+    return radarDS
+
+def getSubset(axExtent, time=None, product="ReflectivityAtLowestAltitude"):
+    # Returns (longitudes, latitudes, float32 data, valid time) cropped to [lonMin, lonMax, latMin, latMax],
+    # or None if time is given and no scan is within maxTimeOffset of it
+    if time is None:
+        gribPath, validTime = fetchLatest(product)
+    else:
+        gribPath, validTime = fetchClosestToTime(time, product)
+        if gribPath is None:
+            return None
+    key = (product, validTime, tuple(float(bound) for bound in axExtent))
+    if key in subsetCache:
+        subsetCache.move_to_end(key)
+        return subsetCache[key]
+    try:
+        radarDS = openProduct(product, validTime, gribPath)
+    except FileNotFoundError:
+        # Pruned by another process between the fetch and the open
+        gribPath = fetchGrib(product, path.basename(gribPath) + ".gz")
+        radarDS = openProduct(product, validTime, gribPath)
+    radarDS = radarDS.sel(latitude=slice(axExtent[3], axExtent[2]), longitude=slice(axExtent[0]+360, axExtent[1]+360))
+    # Copies, a view would keep the whole decoded CONUS grid alive after decodedCache evicts it
+    subsetCache[key] = (np.array(radarDS.longitude.values, copy=True), np.array(radarDS.latitude.values, copy=True), np.ascontiguousarray(radarDS.unknown.values).copy(), validTime)
+    if len(subsetCache) > maxSubsets:
+        subsetCache.popitem(last=False)
+    return subsetCache[key]
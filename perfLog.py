@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Lightweight per-stage timing, peak RSS and bytes fetched, written as one JSON line per run
+# Created 16 October 2026
+
+from os import path, environ, getpid
+from contextlib import contextmanager
+from datetime import datetime as dt
+import time
+import resource
+import json
+import sys
+
+basePath = path.dirname(path.abspath(__file__))
+# Stdout by default so the services' records go to journald, set HDWX_PERF_LOG to a file path to append there instead
+logPath = environ.get("HDWX_PERF_LOG", "-")
+processStart = time.perf_counter()
+runStart = processStart
+stages = {}
+bytesFetched = 0
+
+def mark(name):
+    # Time from the end of the last run (or process start) until now, used for the import stage
+    stages[name] = stages.get(name, 0) + time.perf_counter() - runStart
+
+@contextmanager
+def stage(name):
+    stageStart = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0) + time.perf_counter() - stageStart
+
+def addBytes(numBytes):
+    global bytesFetched
+    bytesFetched += numBytes
+
+def processPeakRSSMB():
+    # High-water mark over the whole process lifetime, not per run. ru_maxrss is kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def emit(script, **extra):
+    record = {
+        "script" : script,
+        "time" : dt.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "pid" : getpid(),
+        "total" : round(time.perf_counter() - runStart, 4),
+        "stages" : {name : round(seconds, 4) for name, seconds in stages.items()},
+        "processPeakRSSMB" : round(processPeakRSSMB(), 1),
+        "bytesFetched" : bytesFetched
+    }
+    record.update(extra)
+    if logPath == "-":
+        print(json.dumps(record), file=sys.stdout, flush=True)
+    else:
+        with open(logPath, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    reset()
+    return record
+
+def reset():
+    global runStart, stages, bytesFetched
+    runStart = time.perf_counter()
+    stages = {}
+    bytesFetched = 0
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# Append-only binary store of TASC position fixes shared by the fetchers, plotter and cleanup
+# Created 16 October 2026
+
+from os import path, replace, remove, truncate
+from contextlib import contextmanager
+from datetime import datetime as dt, timedelta
+import threading
+import fcntl
+import sys
+import numpy as np
+import pandas as pd
+
+basePath = path.dirname(path.abspath(__file__))
+defaultStorePath = path.join(basePath, "tascLoc.bin")
+legacyCSVPath = path.join(basePath, "tascLoc.csv")
+# Fixed size records sorted by time, time is nanoseconds since the epoch (UTC)
+recordDtype = np.dtype([("time", "<i8"), ("lat", "<f8"), ("lon", "<f8"), ("deltaLat", "<f8"), ("deltaLon", "<f8"), ("type", "u1")])
+# Records older than this are dropped on compaction, matching the old 24h CSV trim
+maxAge = timedelta(days=1)
+# How far past maxAge the oldest record can get before an append kicks off a compaction
+compactSlack = timedelta(hours=1)
+
+def typeToCode(typeStr):
+    # "APRS" is 0, maidenhead fixes are stored as their character count
+    if typeStr == "APRS":
+        return 0
+    return int(typeStr.split("-")[0])
+
+def codeToType(code):
+    if code == 0:
+        return "APRS"
+    return f"{code}-character maidenhead"
+
+@contextmanager
+def lockedStore(storePath=defaultStorePath):
+    # Lock a sidecar file so compaction can swap the store out from under it
+    with open(storePath + ".lock", "a") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+def recordsFromDataFrame(data):
+    records = np.zeros(len(data), dtype=recordDtype)
+    records["time"] = pd.to_datetime(data.index).values.astype("datetime64[ns]").astype(np.int64)
+    records["lat"] = data["lat"].values
+    records["lon"] = data["lon"].values
+    records["deltaLat"] = data["deltaLat"].values
+    records["deltaLon"] = data["deltaLon"].values
+    records["type"] = [typeToCode(typeStr) for typeStr in data["type"]]
+    return records
+
+def toDataFrame(records):
+    return pd.DataFrame({"lat": records["lat"], "lon": records["lon"], "deltaLat": records["deltaLat"], "deltaLon": records["deltaLon"],
+                         "type": pd.Series(records["type"]).map(codeToType).values}, index=pd.to_datetime(records["time"]))
+
+def migrateLegacyCSV(storePath=defaultStorePath):
+    # Seed a missing store from the old tascLoc.csv the first time it's touched
+    if path.exists(storePath) or storePath != defaultStorePath or not path.exists(legacyCSVPath):
+        return
+    data = pd.read_csv(legacyCSVPath, index_col=0)
+    data.index = pd.to_datetime(data.index)
+    records = recordsFromDataFrame(data)
+    records = records[np.argsort(records["time"], kind="stable")]
+    _, firstIdx = np.unique(records["time"], return_index=True)
+    with lockedStore(storePath):
+        if not path.exists(storePath):
+            writeRecords(records[firstIdx], storePath)
+
+def readRecords(storePath=defaultStorePath):
+    # Zero-copy view of every record in the store
+    if not path.exists(storePath):
+        return np.zeros(0, dtype=recordDtype)
+    numRecords = path.getsize(storePath) // recordDtype.itemsize
+    if numRecords == 0:
+        return np.zeros(0, dtype=recordDtype)
+    return np.memmap(storePath, dtype=recordDtype, mode="r", shape=(numRecords,))
+
+def readRange(start=None, end=None, storePath=defaultStorePath):
+    # Records with start < time <= end, found by binary search
+    migrateLegacyCSV(storePath)
+    records = readRecords(storePath)
+    startIdx = 0
+    endIdx = len(records)
+    if start is not None:
+        startIdx = np.searchsorted(records["time"], np.datetime64(start, "ns").astype(np.int64), side="right")
+    if end is not None:
+        endIdx = np.searchsorted(records["time"], np.datetime64(end, "ns").astype(np.int64), side="right")
+    return records[startIdx:endIdx]
+
+def readDataFrame(start=None, end=None, storePath=defaultStorePath):
+    return toDataFrame(readRange(start, end, storePath))
+
+def readRecordAt(idx, storePath=defaultStorePath):
+    migrateLegacyCSV(storePath)
+    if not path.exists(storePath):
+        return None
+    with open(storePath, "rb") as f:
+        numRecords = path.getsize(storePath) // recordDtype.itemsize
+        if numRecords == 0:
+            return None
+        f.seek((idx % numRecords) * recordDtype.itemsize)
+        return np.frombuffer(f.read(recordDtype.itemsize), dtype=recordDtype)[0]
+
+def firstTime(storePath=defaultStorePath):
+    record = readRecordAt(0, storePath)
+    if record is None:
+        return None
+    return pd.to_datetime(record["time"]).to_pydatetime()
+
+def lastTime(storePath=defaultStorePath):
+    # Constant time, only reads the final record
+    record = readRecordAt(-1, storePath)
+    if record is None:
+        return None
+    return pd.to_datetime(record["time"]).to_pydatetime()
+
+def writeRecords(records, storePath=defaultStorePath):
+    # Callers must hold the store lock
+    with open(storePath + ".tmp", "wb") as f:
+        f.write(records.tobytes())
+    replace(storePath + ".tmp", storePath)
+
+def truncatePartialRecord(storePath=defaultStorePath):
+    # Callers must hold the store lock. An append cut short (disk full, killed mid-write) leaves a fragment
+    # that would misalign every record appended after it, so it's dropped
+    if not path.exists(storePath):
+        return
+    storeSize = path.getsize(storePath)
+    if storeSize % recordDtype.itemsize != 0:
+        print(f"Dropping {storeSize % recordDtype.itemsize} byte partial record from the end of {storePath}")
+        truncate(storePath, storeSize // recordDtype.itemsize * recordDtype.itemsize)
+
+def append(data, storePath=defaultStorePath):
+    newRecords = recordsFromDataFrame(data)
+    newRecords = newRecords[np.argsort(newRecords["time"], kind="stable")]
+    _, firstIdx = np.unique(newRecords["time"], return_index=True)
+    newRecords = newRecords[firstIdx]
+    if len(newRecords) == 0:
+        return
+    migrateLegacyCSV(storePath)
+    with lockedStore(storePath):
+        truncatePartialRecord(storePath)
+        oldRecords = readRecords(storePath)
+        if len(oldRecords) > 0:
+            # Existing fixes win on duplicate timestamps, same as the old keep="first"
+            existingIdx = np.searchsorted(oldRecords["time"], newRecords["time"]).clip(max=len(oldRecords)-1)
+            newRecords = newRecords[oldRecords["time"][existingIdx] != newRecords["time"]]
+            if len(newRecords) == 0:
+                return
+        if len(oldRecords) == 0 or newRecords["time"][0] > oldRecords["time"][-1]:
+            with open(storePath, "ab") as f:
+                f.write(newRecords.tobytes())
+        else:
+            # Out of order fixes (WSPR spots arrive late) need a merge to keep the file sorted
+            merged = np.concatenate([oldRecords, newRecords])
+            merged = merged[np.argsort(merged["time"], kind="stable")]
+            writeRecords(merged, storePath)
+    oldestTime = firstTime(storePath)
+    if oldestTime is not None and oldestTime < dt.utcnow() - maxAge - compactSlack:
+        threading.Thread(target=compact, args=(storePath,)).start()
+
+def compact(storePath=defaultStorePath, keepFor=maxAge):
+    with lockedStore(storePath):
+        records = np.array(readRecords(storePath))
+        if len(records) == 0:
+            return
+        records = records[np.argsort(records["time"], kind="stable")]
+        _, firstIdx = np.unique(records["time"], return_index=True)
+        records = records[firstIdx]
+        cutOffTime = np.datetime64(dt.utcnow() - keepFor, "ns").astype(np.int64)
+        records = records[records["time"] > cutOffTime]
+        writeRecords(records, storePath)
+
+def removeStore(storePath=defaultStorePath):
+    with lockedStore(storePath):
+        if path.exists(storePath):
+            remove(storePath)
+
+def importCSV(csvPath=legacyCSVPath, storePath=defaultStorePath):
+    data = pd.read_csv(csvPath, index_col=0)
+    data.index = pd.to_datetime(data.index)
+    append(data, storePath)
+
+def exportCSV(csvPath=legacyCSVPath, storePath=defaultStorePath):
+    readDataFrame(storePath=storePath).to_csv(csvPath)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ["import", "export", "compact"]:
+        print("Usage: positionStore.py import|export|compact [csvPath]")
+        exit()
+    csvPath = sys.argv[2] if len(sys.argv) > 2 else legacyCSVPath
+    if sys.argv[1] == "import":
+        importCSV(csvPath)
+    elif sys.argv[1] == "export":
+        exportCSV(csvPath)
+    else:
+        compact()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Pushes only the outputs written since the last publish to the web server
+# Created 16 October 2026
+
+from os import path, replace, remove, getpid
+from glob import glob
+import subprocess
+import argparse
+import frameOutput
+
+basePath = path.dirname(path.abspath(__file__))
+
+def claimBatches():
+    # The renderers keep appending to publishList.txt, so it's renamed out of the way first.
+    # Batches left behind by a failed rsync are picked up again
+    try:
+        replace(frameOutput.publishListPath, f"{frameOutput.publishListPath}.{getpid()}")
+    except FileNotFoundError:
+        pass
+    return glob(frameOutput.publishListPath + ".*")
+
+def readBatches(batchPaths):
+    # Deduplicated, and anything retention already deleted is dropped
+    relPaths = set()
+    for batchPath in batchPaths:
+        with open(batchPath, "r") as f:
+            relPaths.update(line.strip() for line in f if line.strip() != "")
+    return sorted(relPath for relPath in relPaths if path.exists(path.join(frameOutput.outputPath, relPath)))
+
+def publish(targetDir, full=False):
+    if full:
+        return subprocess.run(["rsync", "-ulrH", "./output/.", targetDir, "--exclude=productTypes/", "--exclude=*.tmp"], cwd=basePath).returncode
+    batchPaths = claimBatches()
+    relPaths = readBatches(batchPaths)
+    if len(relPaths) > 0:
+        filesFromPath = path.join(basePath, f"publishFiles.{getpid()}.txt")
+        with open(filesFromPath, "w") as f:
+            f.write("\n".join(relPaths) + "\n")
+        try:
+            returnCode = subprocess.run(["rsync", "-ulH", f"--files-from={filesFromPath}", "--exclude=productTypes/", "./output/.", targetDir], cwd=basePath).returncode
+        finally:
+            remove(filesFromPath)
+        if returnCode != 0:
+            return returnCode
+    for batchPath in batchPaths:
+        remove(batchPath)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rsync the outputs written since the last publish to targetDir")
+    parser.add_argument("targetDir")
+    parser.add_argument("--full", action="store_true", help="sync the whole output tree, e.g. after a new deploy")
+    args = parser.parse_args()
+    exit(publish(args.targetDir, args.full))
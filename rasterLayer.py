@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Regrids rasters on regular source axes (MRMS lat/lon, GOES fixed grid) onto the map projection once, for drawing with imshow
+# Created 16 October 2026
+
+from collections import OrderedDict
+import numpy as np
+from cartopy import crs as ccrs
+
+# Target cells per source cell along x, enough that the nearest-neighbour blocks land where pcolormesh's cells would
+oversample = 4
+# No point regridding finer than the widest image we save
+maxTargetWidth = 3840
+maxCachedIndices = 8
+indexCache = OrderedDict()
+
+def projectedExtent(targetCRS, lonLatExtent, pointsPerEdge=100):
+    # The box set_extent ends up with, the bounds of the densified lon/lat outline in the target projection
+    lonMin, lonMax, latMin, latMax = lonLatExtent
+    edge = np.linspace(0, 1, pointsPerEdge)
+    lons = np.concatenate([lonMin + (lonMax - lonMin)*edge, np.full(pointsPerEdge, lonMax), lonMax - (lonMax - lonMin)*edge, np.full(pointsPerEdge, lonMin)])
+    lats = np.concatenate([np.full(pointsPerEdge, latMin), latMin + (latMax - latMin)*edge, np.full(pointsPerEdge, latMax), latMax - (latMax - latMin)*edge])
+    projected = targetCRS.transform_points(ccrs.PlateCarree(), lons, lats)
+    return [float(projected[:, 0].min()), float(projected[:, 0].max()), float(projected[:, 1].min()), float(projected[:, 1].max())]
+
+def targetShape(targetExtent, sourceShape):
+    nx = int(min(max(1, sourceShape[1] * oversample), maxTargetWidth))
+    ny = max(1, int(round(nx * (targetExtent[3] - targetExtent[2]) / (targetExtent[1] - targetExtent[0]))))
+    return ny, nx
+
+def cellCenters(targetExtent, shape):
+    ny, nx = shape
+    return (targetExtent[0] + (np.arange(nx) + 0.5) * (targetExtent[1] - targetExtent[0]) / nx,
+            targetExtent[2] + (np.arange(ny) + 0.5) * (targetExtent[3] - targetExtent[2]) / ny)
+
+def axisIndices(coords, sourceAxis):
+    # The source axis is evenly spaced, so the nearest index is arithmetic instead of a search
+    if len(sourceAxis) < 2:
+        return np.zeros(len(coords), dtype=np.int32), np.zeros(len(coords), dtype=bool)
+    step = (sourceAxis[-1] - sourceAxis[0]) / (len(sourceAxis) - 1)
+    idx = np.rint((coords - sourceAxis[0]) / step)
+    valid = np.isfinite(idx) & (idx >= 0) & (idx < len(sourceAxis))
+    return np.where(valid, idx, 0).astype(np.int32), valid
+
+def regridIndices(sourceCRS, sourceX, sourceY, targetCRS, targetExtent, shape):
+    # Flat source index and validity for every target cell, cached per source grid, target extent and shape
+    key = (sourceCRS.proj4_init, float(sourceX[0]), float(sourceX[-1]), len(sourceX), float(sourceY[0]), float(sourceY[-1]), len(sourceY),
+           targetCRS.proj4_init, tuple(float(bound) for bound in targetExtent), shape)
+    if key in indexCache:
+        indexCache.move_to_end(key)
+        return indexCache[key]
+    # Cell centers, bottom row first to match imshow's origin="lower"
+    targetX, targetY = np.meshgrid(*cellCenters(targetExtent, shape))
+    sourcePoints = sourceCRS.transform_points(targetCRS, targetX.ravel(), targetY.ravel())
+    colIdx, colValid = axisIndices(sourcePoints[:, 0], sourceX)
+    rowIdx, rowValid = axisIndices(sourcePoints[:, 1], sourceY)
+    flatIdx = (rowIdx * len(sourceX) + colIdx).reshape(shape)
+    invalid = ~(colValid & rowValid).reshape(shape)
+    indexCache[key] = (flatIdx, invalid)
+    if len(indexCache) > maxCachedIndices:
+        indexCache.popitem(last=False)
+    return indexCache[key]
+
+def regrid(values, sourceCRS, sourceX, sourceY, targetCRS, targetExtent, shape=None):
+    # Returns a new float32 (ny, nx) array in the target projection, NaN outside the source grid.
+    # The gather is the only copy, so callers can mask the result in place
+    if shape is None:
+        shape = targetShape(targetExtent, values.shape)
+    if values.size == 0:
+        return np.full(shape, np.nan, dtype=np.float32)
+    flatIdx, invalid = regridIndices(sourceCRS, sourceX, sourceY, targetCRS, targetExtent, shape)
+    raster = np.take(values.reshape(-1), flatIdx).astype(np.float32, copy=False)
+    raster[invalid] = np.nan
+    return raster
+
+def maskAtOrBelow(raster, threshold):
+    # In place, NaN cells are drawn transparent by imshow
+    raster[raster <= threshold] = np.nan
+    return raster
+
+def drawRaster(ax, raster, targetExtent, **kwargs):
+    # The raster is already in ax's projection, so cartopy doesn't warp it again
+    return ax.imshow(raster, origin="lower", extent=targetExtent, transform=ax.projection, interpolation="nearest", **kwargs)
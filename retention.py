@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Expiry-ordered manifest of everything written under output/, swept by cleanup.py
+# Created 16 October 2026
+
+from os import path, walk, remove, rmdir, getpid, sep
+from datetime import timedelta
+import sqlite3
+import time
+
+basePath = path.dirname(path.abspath(__file__))
+outputPath = path.join(basePath, "output")
+manifestPath = path.join(basePath, "retention.db")
+# Per-product retention, keyed by path prefix under output/, the longest matching prefix wins
+productRetention = {
+    "products/tasc/rala" : timedelta(minutes=20),
+    "products/satellite/goes16/sfcobs" : timedelta(minutes=20),
+    "gisproducts/tasc" : timedelta(minutes=20),
+    "metadata" : timedelta(days=2)
+}
+# Anything no product prefix matches falls back to its extension, then to defaultRetention
+extensionRetention = {
+    ".json" : timedelta(days=2)
+}
+defaultRetention = timedelta(minutes=20)
+connection = None
+connectionPid = None
+
+def getConnection():
+    # sqlite connections can't be shared across a fork, backfill workers each open their own
+    global connection, connectionPid
+    if connection is None or connectionPid != getpid():
+        connection = sqlite3.connect(manifestPath, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS outputsByExpiry ON outputs (expires)")
+        connectionPid = getpid()
+    return connection
+
+def retentionFor(filePath):
+    relPath = path.relpath(path.abspath(filePath), outputPath).replace(sep, "/")
+    matches = [prefix for prefix in productRetention.keys() if relPath == prefix or relPath.startswith(prefix + "/")]
+    if len(matches) > 0:
+        return productRetention[max(matches, key=len)]
+    return extensionRetention.get(path.splitext(relPath)[1], defaultRetention)
+
+def register(filePath, writtenAt=None):
+    # Re-registering a path (rewritten metadata, latest.json) pushes its expiry back
+    if writtenAt is None:
+        writtenAt = time.time()
+    expires = writtenAt + retentionFor(filePath).total_seconds()
+    getConnection().execute("INSERT OR REPLACE INTO outputs (path, expires) VALUES (?, ?)", (path.abspath(filePath), expires))
+
+def pruneEmptyDirs(dirPaths):
+    # Walks up from each directory until one isn't empty or output/ itself is reached
+    for dirPath in sorted(dirPaths, key=len, reverse=True):
+        while dirPath.startswith(outputPath + sep):
+            try:
+                rmdir(dirPath)
+            except OSError:
+                break
+            dirPath = path.dirname(dirPath)
+
+def sweep(now=None):
+    # Only touches expired entries, oldest first, returns the number of files removed
+    if now is None:
+        now = time.time()
+    db = getConnection()
+    removed = 0
+    removedPaths = []
+    # IMMEDIATE holds the write lock, so no writer can re-register a path between the select and the delete
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        for expiredPath, expires in db.execute("SELECT path, expires FROM outputs WHERE expires <= ? ORDER BY expires", (now,)).fetchall():
+            try:
+                # Writers rename into place before registering, so a file rewritten just now may still carry an expired row
+                rewrittenExpiry = path.getmtime(expiredPath) + retentionFor(expiredPath).total_seconds()
+            except FileNotFoundError:
+                rewrittenExpiry = None
+            if rewrittenExpiry is not None and rewrittenExpiry > now:
+                db.execute("UPDATE outputs SET expires = ? WHERE path = ? AND expires = ?", (rewrittenExpiry, expiredPath, expires))
+                continue
+            if rewrittenExpiry is not None:
+                remove(expiredPath)
+                removed += 1
+                removedPaths.append(expiredPath)
+            db.execute("DELETE FROM outputs WHERE path = ? AND expires = ?", (expiredPath, expires))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    pruneEmptyDirs({path.dirname(removedPath) for removedPath in removedPaths})
+    return removed
+
+def fullScan(now=None):
+    # Fallback for files written before the manifest existed or by something that didn't register them
+    if now is None:
+        now = time.time()
+    removed = 0
+    emptyDirs = set()
+    if not path.exists(outputPath):
+        return removed
+    for root, dirs, files in walk(outputPath):
+        for name in files:
+            filePath = path.join(root, name)
+            if path.getmtime(filePath) + retentionFor(filePath).total_seconds() < now:
+                remove(filePath)
+                removed += 1
+                emptyDirs.add(root)
+    pruneEmptyDirs(emptyDirs)
+    return removed
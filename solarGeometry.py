@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Vectorized solar position over lat/lon grids
+# Created 16 October 2026
+
+import numpy as np
+import pandas as pd
+
+def solarZenithAngle(lats, lons, time):
+    # NOAA solar calculator (Meeus) Julian century formulation, geometric zenith without refraction. time is UTC.
+    # Only the per-point hour angle and zenith are array math, everything else is a scalar for the whole grid
+    time = pd.Timestamp(time)
+    if time.tzinfo is not None:
+        time = time.tz_convert("UTC").tz_localize(None)
+    lats = np.radians(np.asarray(lats, dtype=np.float32))
+    lons = np.asarray(lons, dtype=np.float32)
+    julianCentury = (time.to_julian_date() - 2451545) / 36525
+    meanLongitude = (280.46646 + julianCentury*(36000.76983 + julianCentury*0.0003032)) % 360
+    meanAnomaly = np.radians(357.52911 + julianCentury*(35999.05029 - 0.0001537*julianCentury))
+    eccentricity = 0.016708634 - julianCentury*(0.000042037 + 0.0000001267*julianCentury)
+    equationOfCenter = (np.sin(meanAnomaly)*(1.914602 - julianCentury*(0.004817 + 0.000014*julianCentury))
+                        + np.sin(2*meanAnomaly)*(0.019993 - 0.000101*julianCentury) + np.sin(3*meanAnomaly)*0.000289)
+    omega = np.radians(125.04 - 1934.136*julianCentury)
+    apparentLongitude = np.radians(meanLongitude + equationOfCenter - 0.00569 - 0.00478*np.sin(omega))
+    obliquity = np.radians(23 + (26 + (21.448 - julianCentury*(46.815 + julianCentury*(0.00059 - julianCentury*0.001813)))/60)/60 + 0.00256*np.cos(omega))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparentLongitude))
+    varY = np.tan(obliquity/2)**2
+    meanLongitude = np.radians(meanLongitude)
+    eqTime = 4 * np.degrees(varY*np.sin(2*meanLongitude) - 2*eccentricity*np.sin(meanAnomaly) + 4*eccentricity*varY*np.sin(meanAnomaly)*np.cos(2*meanLongitude)
+                            - 0.5*varY**2*np.sin(4*meanLongitude) - 1.25*eccentricity**2*np.sin(2*meanAnomaly))
+    minuteOfDay = time.hour*60 + time.minute + time.second/60
+    trueSolarTime = (np.float32(minuteOfDay + eqTime) + 4*lons) % 1440
+    hourAngle = np.radians(trueSolarTime/4 - 180)
+    cosZenith = np.sin(lats)*np.float32(np.sin(declination)) + np.cos(lats)*np.float32(np.cos(declination))*np.cos(hourAngle)
+    return np.degrees(np.arccos(np.clip(cosZenith, -1, 1)))
+
+def interpolateToShape(coarse, shape, step):
+    # Bilinear upsampling of a grid decimated with [::step, ::step] back to its full shape
+    def weights(length, coarseLength):
+        fine = np.arange(length)
+        lower = np.clip(fine // step, 0, coarseLength - 2)
+        frac = np.clip((fine - lower*step)/step, 0, 1).astype(np.float32)
+        return lower, frac
+    rowLower, rowFrac = weights(shape[0], coarse.shape[0])
+    colLower, colFrac = weights(shape[1], coarse.shape[1])
+    top = coarse[rowLower, :]
+    bottom = coarse[rowLower + 1, :]
+    rowInterp = top + (bottom - top) * rowFrac[:, np.newaxis]
+    left = rowInterp[:, colLower]
+    right = rowInterp[:, colLower + 1]
+    return left + (right - left) * colFrac[np.newaxis, :]
+
+def solarZenithGrid(lats, lons, time, step=1):
+    # step > 1 computes on a decimated grid and interpolates, the zenith angle is smooth enough that this is invisible
+    lats = np.asarray(lats)
+    lons = np.asarray(lons)
+    if step <= 1 or lats.shape[0] <= step or lats.shape[1] <= step:
+        return solarZenithAngle(lats, lons, time)
+    coarse = solarZenithAngle(lats[::step, ::step], lons[::step, ::step], time)
+    return interpolateToShape(coarse, lats.shape, step)
+
+def daylightMask(lats, lons, time, maxZenith=89, step=1):
+    return solarZenithGrid(lats, lons, time, step) <= maxZenith
@@ -2,30 +2,30 @@
 # Surface Observations+vis satellite product generation for python HDWX
 # Created 23 May 2024 by Sam Gardner <samuel.gardner@ttu.edu>
 
-
-import xarray as xr
+import perfLog
 from matplotlib import pyplot as plt
 import numpy as np
 from cartopy import crs as ccrs
 from cartopy import feature as cfeat
 import metpy
 from metpy.units import pandas_dataframe_to_unit_arrays
-from metpy.io import parse_metar_file
 from metpy import calc as mpcalc
 from metpy import plots as mpplots
 from metpy.units import units
-from metpy.cbook import get_test_data
 from matplotlib.patheffects import withStroke
 from os import path
 import pandas as pd
 from siphon.catalog import TDSCatalog
-from os import path, remove
-from pathlib import Path
-from datetime import datetime as dt, timedelta, UTC
+from datetime import datetime as dt, timedelta
 import json
-import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pyart
-import pysolar
+import solarGeometry
+import goesGridCache
+import rasterLayer
+import mrmsCache
+import frameOutput
+import metarCache
 
 
 basePath = path.dirname(path.abspath(__file__))
@@ -34,138 +34,199 @@ if path.exists(path.join(basePath, "HDWX_helpers.py")):
     hasHelpers = True
 else:
     hasHelpers = False
+perfLog.mark("import")
+mapCRS = ccrs.LambertConformal()
 
 def gamma_correct(data, channel):
+    # In place, data is a freshly regridded float32 raster
     if channel == 2:
-        data = (data * np.pi * 0.3)/663.274497
-        data = np.clip(data, 0, 1)
-    return data**0.5
+        data *= np.float32(np.pi * 0.3 / 663.274497)
+        np.clip(data, 0, 1, out=data)
+    return np.sqrt(data, out=data)
 
-def addMRMSToFig(ax, time, data="ReflectivityAtLowestAltitude"):
-    if path.exists("../hdwx-hlma/radarDataFetch.py"):
-        sys.path.append("../hdwx-hlma/")
-        import radarDataFetch
-        mrmsGribName = radarDataFetch.fetchRadarClosestToTime(time, data)
-        if ".grib" in mrmsGribName:
-            datasetFilePath = path.join(basePath, "radarInput", mrmsGribName)
-            radarDS = xr.open_dataset(datasetFilePath)
-            radarDS = radarDS.sel(latitude=slice(axExtent[3], axExtent[2]), longitude=slice(axExtent[0]+360, axExtent[1]+360))
-            if data == "ReflectivityAtLowestAltitude":
-                radarData = np.ma.masked_array(radarDS.unknown.data, mask=np.where(radarDS.unknown.data > 5, 0, 1))
-                cmap = "pyart_ChaseSpectral"
-                vmin=-10
-                vmax=80
-            elif data == "RadarOnly_QPE_01H":
-                radarData = np.ma.masked_array(radarDS.unknown.data, mask=np.where(radarDS.unknown.data > 0, 0, 1))/25.4
-                cmap = "viridis"
-                vmin=0
-                vmax=10
-                labels = ax.contour(radarDS.longitude, radarDS.latitude, radarData, levels=range(1, 99, 1), cmap="viridis", vmin=0, vmax=10, linewidths=0.5, transform=ccrs.PlateCarree(), zorder=5)
-            rdr = ax.pcolormesh(radarDS.longitude, radarDS.latitude, radarData, cmap=cmap, vmin=vmin, vmax=vmax, transform=ccrs.PlateCarree(), zorder=5, alpha=0.5)
-            return rdr
-    else:
+def fetchMRMS(time, data="ReflectivityAtLowestAltitude"):
+    # Returns the subset regridded onto mapCRS and masked, as (float32 raster, projected extent, valid time)
+    try:
+        radarSubset = mrmsCache.getSubset(axExtent, time, data)
+    except Exception as e:
+        print(f"Failed to fetch MRMS {data}: {e}")
+        return None
+    if radarSubset is None:
+        print(f"No MRMS {data} scan close to {time}")
         return None
+    radarLons, radarLats, radarValues, validTime = radarSubset
+    with perfLog.stage("mrmsRegrid"):
+        targetExtent = rasterLayer.projectedExtent(mapCRS, axExtent)
+        radarData = rasterLayer.regrid(radarValues, ccrs.PlateCarree(), np.where(radarLons > 180, radarLons - 360, radarLons), radarLats, mapCRS, targetExtent)
+        if data == "ReflectivityAtLowestAltitude":
+            rasterLayer.maskAtOrBelow(radarData, 5)
+        elif data == "RadarOnly_QPE_01H":
+            rasterLayer.maskAtOrBelow(radarData, 0)
+            radarData /= 25.4
+    return radarData, targetExtent, validTime
 
-def addStationPlot(ax, validTime):
-    metarTime = validTime.replace(minute=0, second=0, microsecond=0)
-    stationCatalog = TDSCatalog("https://thredds.ucar.edu/thredds/catalog/noaaport/text/metar/catalog.xml")
-    airports = pd.read_csv(get_test_data("airport-codes.csv"))
-    airports = airports[(airports["type"] == "large_airport") | (airports["type"] == "medium_airport") | (airports["type"] == "small_airport")]
+def drawMRMS(ax, radarRaster, data="ReflectivityAtLowestAltitude"):
+    if radarRaster is None:
+        return None
+    radarData, targetExtent, _ = radarRaster
+    if data == "ReflectivityAtLowestAltitude":
+        cmap = "pyart_ChaseSpectral"
+        vmin=-10
+        vmax=80
+    elif data == "RadarOnly_QPE_01H":
+        cmap = "viridis"
+        vmin=0
+        vmax=10
+        rasterX, rasterY = rasterLayer.cellCenters(targetExtent, radarData.shape)
+        labels = ax.contour(rasterX, rasterY, radarData, levels=range(1, 99, 1), cmap="viridis", vmin=0, vmax=10, linewidths=0.5, transform=ax.projection, zorder=5)
+    rdr = rasterLayer.drawRaster(ax, radarData, targetExtent, cmap=cmap, vmin=vmin, vmax=vmax, zorder=5, alpha=0.5)
+    return rdr
+
+def addMRMSToFig(ax, time, data="ReflectivityAtLowestAltitude"):
+    return drawMRMS(ax, fetchMRMS(time, data), data)
+
+def fetchStations(validTime):
     try:
-        dataset = stationCatalog.datasets.filter_time_nearest(metarTime)
-        dataset.download()
-        [remove(file) for file in sorted(listdir()) if "metar_" in file and file != dataset.name]
+        return metarCache.getStationTable(validTime, 50000)
     except Exception as e:
-        print(stationCatalog.datasets.filter_time_nearest(metarTime).remote_open().read())
-    if path.exists(dataset.name):
-        metarData = parse_metar_file(dataset.name, year=metarTime.year, month=metarTime.month)
-    else:
-        return
-    metarUnits = metarData.units
+        print(f"Failed to fetch METARs: {e}")
+        return None
 
-    metarDataFilt = metarData[metarData["station_id"].isin(airports["ident"])]
-    metarDataFilt = metarDataFilt.dropna(how="any", subset=["longitude", "latitude", "station_id", "wind_speed", "wind_direction", "air_temperature", "dew_point_temperature", "air_pressure_at_sea_level", "current_wx1_symbol", "cloud_coverage"])
-    metarDataFilt = metarDataFilt.drop_duplicates(subset=["station_id"], keep="last")
-    metarData = pandas_dataframe_to_unit_arrays(metarDataFilt, metarUnits)
+def drawStationPlot(ax, stationData, validTime):
+    if stationData is None:
+        return ax
+    stationTable, metarUnits = stationData
+    # Only the stations kept by the cached reduce_point_density pass get converted to unit arrays
+    metarData = pandas_dataframe_to_unit_arrays(stationTable[stationTable["selected"]], metarUnits)
     metarData["u"], metarData["v"] = mpcalc.wind_components(metarData["wind_speed"], metarData["wind_direction"])
-    locationsInMeters = ccrs.epsg(3857).transform_points(ccrs.PlateCarree(), metarData["longitude"].m, metarData["latitude"].m)
-    overlap_prevent = mpcalc.reduce_point_density(locationsInMeters[:, 0:2], 50000)
-    stations = mpplots.StationPlot(ax, metarData["longitude"][overlap_prevent], metarData["latitude"][overlap_prevent], clip_on=True, transform=ccrs.PlateCarree(), fontsize=6)
-    stations.plot_parameter("NW", metarData["air_temperature"][overlap_prevent].to(units.degF), path_effects=[withStroke(linewidth=1, foreground="white")])
-    stations.plot_parameter("SW", metarData["dew_point_temperature"][overlap_prevent].to(units.degF), path_effects=[withStroke(linewidth=1, foreground="white")])
-    stations.plot_parameter("NE", metarData["air_pressure_at_sea_level"][overlap_prevent].to(units.hPa), formatter=lambda v: format(10 * v, '.0f')[-3:], path_effects=[withStroke(linewidth=1, foreground="white")])
-    stations.plot_symbol((-1.5, 0), metarData['current_wx1_symbol'][overlap_prevent], mpplots.current_weather, path_effects=[withStroke(linewidth=1, foreground="white")], fontsize=9)
+    stations = mpplots.StationPlot(ax, metarData["longitude"], metarData["latitude"], clip_on=True, transform=ccrs.PlateCarree(), fontsize=6)
+    stations.plot_parameter("NW", metarData["air_temperature"].to(units.degF), path_effects=[withStroke(linewidth=1, foreground="white")])
+    stations.plot_parameter("SW", metarData["dew_point_temperature"].to(units.degF), path_effects=[withStroke(linewidth=1, foreground="white")])
+    stations.plot_parameter("NE", metarData["air_pressure_at_sea_level"].to(units.hPa), formatter=lambda v: format(10 * v, '.0f')[-3:], path_effects=[withStroke(linewidth=1, foreground="white")])
+    stations.plot_symbol((-1.5, 0), metarData['current_wx1_symbol'], mpplots.current_weather, path_effects=[withStroke(linewidth=1, foreground="white")], fontsize=9)
     if validTime.minute == 1 or validTime.minute == 21 or validTime.minute == 41:
-        stations.plot_text((2, 0), metarData["station_id"][overlap_prevent], path_effects=[withStroke(linewidth=2, foreground="white")])
-    stations.plot_symbol("C", metarData["cloud_coverage"][overlap_prevent], mpplots.sky_cover)
-    stations.plot_barb(metarData["u"][overlap_prevent], metarData["v"][overlap_prevent], sizes={"emptybarb" : 0})
+        stations.plot_text((2, 0), metarData["station_id"], path_effects=[withStroke(linewidth=2, foreground="white")])
+    stations.plot_symbol("C", metarData["cloud_coverage"], mpplots.sky_cover)
+    stations.plot_barb(metarData["u"], metarData["v"], sizes={"emptybarb" : 0})
     return ax
 
-def plotSat():
-    # Get the satellite data
-    dataAvail = TDSCatalog("https://thredds.ucar.edu/thredds/catalog/satellite/goes/east/products/CloudAndMoistureImagery/CONUS/Channel02/current/catalog.xml").datasets[-1]
-    latestTimeAvailable = dt.strptime(dataAvail.name.split("_")[3][:-3], "s%Y%j%H%M")
+def addStationPlot(ax, validTime):
+    return drawStationPlot(ax, fetchStations(validTime), validTime)
+
+def goesScanTime(dataAvail):
+    return dt.strptime(dataAvail.name.split("_")[3][:-3], "s%Y%j%H%M")
+
+def findGOESDatasets(day="current"):
+    # day is "current" or a datetime, older days live in per-date catalogs
+    if day != "current":
+        day = day.strftime("%Y%m%d")
+    return TDSCatalog(f"https://thredds.ucar.edu/thredds/catalog/satellite/goes/east/products/CloudAndMoistureImagery/CONUS/Channel02/{day}/catalog.xml").datasets
+
+def alreadyPlotted(latestTimeAvailable):
     outputMetadataPath = path.join(basePath, "output", "metadata", "products", "6", latestTimeAvailable.strftime("%Y%m%d%H00") + ".json")
     if path.exists(outputMetadataPath):
         with open(outputMetadataPath, "r") as f:
             currentRunMetadata = json.load(f)
         lastPlottedTime = dt.strptime(currentRunMetadata["productFrames"][-1]["valid"], "%Y%m%d%H%M")
         if lastPlottedTime >= latestTimeAvailable:
-            exit()
-    vis_dataset = dataAvail.remote_access(use_xarray=True)
-    dataset_transformed = vis_dataset.metpy.parse_cf("Sectorized_CMI").metpy.assign_latitude_longitude()
-    lons_to_plot = dataset_transformed.longitude.data
-    lats_to_plot = dataset_transformed.latitude.data
-    data_mask = np.ones_like(lons_to_plot, dtype=bool)
-    data_mask[(lons_to_plot > axExtent[1]) | (lons_to_plot < axExtent[0])] = False
-    data_mask[(lats_to_plot > axExtent[3]) | (lats_to_plot < axExtent[2])] = False
-    data_mask[np.isnan(dataset_transformed.data)] = False
-    
-    step = 50
-    for i in range(step, lons_to_plot.shape[0], step):
-        for j in range(step, lons_to_plot.shape[1], step):
-            lon, lat = np.max(lons_to_plot[i-step:i, j-step:j]), np.mean(lats_to_plot[i-step:i, j-step:j])
-            solar_zenith_angle = 90 - pysolar.solar.get_altitude(lat, lon, latestTimeAvailable.replace(tzinfo=UTC))
-            if solar_zenith_angle <= 89:
-                continue
-            else:
-                data_mask[i-step:i, j-step:j] = False
-    
-    data_to_plot = np.where(data_mask, dataset_transformed.data, np.nan)
-    valid_rows = ~np.isnan(data_to_plot).all(axis=1)
-    valid_cols = ~np.isnan(data_to_plot).all(axis=0)
-    lons_to_plot = lons_to_plot[valid_rows, :][:, valid_cols]
-    lats_to_plot = lats_to_plot[valid_rows, :][:, valid_cols]
-    data_to_plot = data_to_plot[valid_rows, :][:, valid_cols]
-    validTime = pd.to_datetime(dataset_transformed.time.data)
+            return True
+    return False
 
+def fetchGOES(dataAvail):
+    # Reads, masks and regrids the satellite data onto mapCRS, nothing here touches the figure so it can run off the main thread
+    latestTimeAvailable = goesScanTime(dataAvail)
+    with perfLog.stage("goesOpen"):
+        vis_dataset = dataAvail.remote_access(use_xarray=True)
+        rowSlice, colSlice, lats_to_plot, lons_to_plot, data_mask = goesGridCache.getCropWindow(vis_dataset, "Sectorized_CMI", axExtent)
+    # Only the crop window's hyperslab is requested from the server
+    with perfLog.stage("goesFetch"):
+        cmi_subset = vis_dataset["Sectorized_CMI"].isel(y=rowSlice, x=colSlice)
+        cmi_data = cmi_subset.values.astype(np.float32)
+        perfLog.addBytes(cmi_data.nbytes)
+    with perfLog.stage("solarMask"):
+        data_mask = data_mask & solarGeometry.daylightMask(lats_to_plot, lons_to_plot, latestTimeAvailable, maxZenith=89, step=8)
+        cmi_data[~data_mask] = np.nan
+    # The whole crop window is regridded so the cached indices stay valid from scan to scan
+    with perfLog.stage("goesRegrid"):
+        geos, fixedGridX, fixedGridY = goesGridCache.fixedGridAxes(vis_dataset, "Sectorized_CMI")
+        targetExtent = rasterLayer.projectedExtent(mapCRS, axExtent)
+        data_to_plot = gamma_correct(rasterLayer.regrid(cmi_data, geos, fixedGridX[colSlice], fixedGridY[rowSlice], mapCRS, targetExtent), 2)
+    validTime = pd.to_datetime(cmi_subset.time.data)
+    return data_to_plot, targetExtent, validTime
+
+def drawGOES(ax, goesData):
+    data_to_plot, targetExtent, _ = goesData
+    with perfLog.stage("goesImshow"):
+        rasterLayer.drawRaster(ax, data_to_plot, targetExtent, cmap="Greys_r")
+
+def plotSat(dataAvail):
+    goesData = fetchGOES(dataAvail)
     fig = plt.figure()
-    ax = plt.axes(projection=ccrs.LambertConformal())
-    if len(lons_to_plot) > 0:
-        ax.pcolormesh(lons_to_plot, lats_to_plot, gamma_correct(data_to_plot, 2), transform=ccrs.PlateCarree(), cmap='Greys_r')
-    return fig, ax, validTime
-    
+    ax = plt.axes(projection=mapCRS)
+    drawGOES(ax, goesData)
+    return fig, ax, goesData[2]
 
+def prefetch(dataAvail, executor):
+    # The target time comes from the GOES file name, so MRMS and METAR don't have to wait for the satellite read
+    targetTime = goesScanTime(dataAvail)
+    return {
+        executor.submit(fetchGOES, dataAvail) : "goes",
+        executor.submit(fetchMRMS, targetTime) : "mrms",
+        executor.submit(fetchStations, targetTime) : "stationPlot"
+    }, targetTime
 
-if __name__ == "__main__":
-    fig, ax, validTime = plotSat()
-    ax.add_feature(cfeat.COASTLINE.with_scale("50m"), linewidth=1, edgecolor="black", zorder=10)
-    ax.add_feature(cfeat.STATES.with_scale("50m"), linewidth=0.5, edgecolor="black", zorder=9)
-    ax.set_extent(axExtent)
-    rdr = addMRMSToFig(ax, validTime)
+
+def renderFrame(dataAvail, writeMetadata=True):
+    # Metadata frames are returned instead of written when writeMetadata is False so backfill can write them serially
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        layerFutures, targetTime = prefetch(dataAvail, executor)
+        # The base map is built while the fetches are in flight, each layer is drawn as soon as its data arrives
+        fig = plt.figure()
+        ax = plt.axes(projection=mapCRS)
+        with perfLog.stage("features"):
+            ax.add_feature(cfeat.COASTLINE.with_scale("50m"), linewidth=1, edgecolor="black", zorder=10)
+            ax.add_feature(cfeat.STATES.with_scale("50m"), linewidth=0.5, edgecolor="black", zorder=9)
+        ax.set_extent(axExtent)
+        rdr = None
+        with perfLog.stage("prefetchWait"):
+            for layerFuture in as_completed(layerFutures):
+                layer = layerFutures[layerFuture]
+                if layer == "goes":
+                    goesData = layerFuture.result()
+                    drawGOES(ax, goesData)
+                    validTime = goesData[2]
+                elif layer == "mrms":
+                    with perfLog.stage("mrmsDraw"):
+                        rdr = drawMRMS(ax, layerFuture.result())
+                else:
+                    with perfLog.stage("stationPlot"):
+                        ax = drawStationPlot(ax, layerFuture.result(), targetTime)
     if rdr is not None:
         notice = "MRMS data provided by NOAA/NSSL"
     else:
         notice = None
-    ax = addStationPlot(ax, validTime)
     
     outputPath = path.join(basePath, "output", "products", "satellite", "goes16", "sfcobs", validTime.strftime("%Y"), validTime.strftime("%m"), validTime.strftime("%d"), validTime.strftime("%H00"), validTime.strftime("%M.png"))
-    Path(path.dirname(outputPath)).mkdir(parents=True, exist_ok=True)
-    if hasHelpers:
-        HDWX_helpers.dressImage(fig, ax, "Surface Obs + GOES-16 visible", validTime, plotHandle=rdr, colorbarLabel="MRMS Reflectivity at Lowest Altitude (dBZ)", notice=notice, width=3840, height=2160)
     if hasHelpers:
-        HDWX_helpers.saveImage(fig, outputPath)
-        HDWX_helpers.writeJson(path.abspath(path.dirname(__file__)), 6, runTime=(validTime - timedelta(minutes=validTime.minute)), fileName=validTime.strftime("%M.png"), validTime=validTime, gisInfo=["0,0", "0,0"], reloadInterval=270)
-    else:
-        fig.savefig(outputPath)
-    plt.close(fig)
\ No newline at end of file
+        with perfLog.stage("dressImage"):
+            HDWX_helpers.dressImage(fig, ax, "Surface Obs + GOES-16 visible", validTime, plotHandle=rdr, colorbarLabel="MRMS Reflectivity at Lowest Altitude (dBZ)", notice=notice, width=3840, height=2160)
+    with perfLog.stage("saveImage"):
+        frameOutput.saveImage(fig, outputPath)
+    plt.close(fig)
+    metadataFrames = [(6, validTime - timedelta(minutes=validTime.minute), validTime.strftime("%M.png"), validTime, ["0,0", "0,0"], 270)]
+    if writeMetadata:
+        with perfLog.stage("writeJson"):
+            writeMetadataFrames(metadataFrames)
+    perfLog.emit("surface_analysis", frame=validTime.strftime("%Y%m%d%H%M"))
+    return metadataFrames
+
+def writeMetadataFrames(metadataFrames):
+    for metadataFrame in metadataFrames:
+        frameOutput.writeMetadata(*metadataFrame)
+
+
+if __name__ == "__main__":
+    dataAvail = findGOESDatasets()[-1]
+    if alreadyPlotted(goesScanTime(dataAvail)):
+        exit()
+    renderFrame(dataAvail)
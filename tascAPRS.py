@@ -2,35 +2,100 @@
 # Fetches TASC location from APRS
 # Created 24 October 2022 by Sam Gardner <stgardner4@tamu.edu>
 
+import perfLog
 import aprslib
 import pandas as pd
-from os import path, system, remove
-from datetime import datetime as dt, timedelta
-import atexit
+from os import path
+from pathlib import Path
+from datetime import datetime as dt
+import asyncio
+import fnmatch
+import argparse
+import positionStore
 
 
 basePath = path.dirname(path.abspath(__file__))
+perfLog.mark("import")
+aprsServer = "rotate.aprs2.net"
+# 14580 is the user-defined filter port, only packets matching our filter are sent
+aprsPort = 14580
+loginCallsign = "WX5AGS"
+defaultCallsigns = ["WX5AGS-9"]
+# APRS-IS servers send a keepalive comment every ~20 seconds
+readTimeout = 60
+maxBackoff = 300
+# A connection that stays up this many seconds counts as healthy and resets the backoff
+stableConnection = 300
 
 
-def callback(packet):
-    if b"WX5AGS-9" in packet:
-        packet = aprslib.parse(packet)
-        print(packet["path"])
-        if packet["from"] == "WX5AGS-9":
-            newData = pd.DataFrame({"lat": [packet["latitude"]], "lon": [packet["longitude"]], "deltaLat": [0], "deltaLon": [0], "type": ["APRS"]}, index=[dt.utcnow()])
-            if path.exists(path.join(basePath, "tascLoc.csv")):
-                oldData = pd.read_csv(path.join(basePath, "tascLoc.csv"), index_col=0)
-                oldData.index = pd.to_datetime(oldData.index)
-                newData = pd.concat([oldData, newData])
-            newData = newData[~newData.index.duplicated(keep="first")]
-            newData = newData.sort_index()
-            cutOffTime = dt.utcnow() - timedelta(days=1)
-            newData = newData[newData.index > cutOffTime]
-            newData.to_csv(path.join(basePath, "tascLoc.csv"))
-            exit()
-            
+def storePathForCallsign(callsign):
+    # The TASC vehicle keeps the shared default store, anything else gets its own
+    if callsign == "WX5AGS-9":
+        return positionStore.defaultStorePath
+    Path(path.join(basePath, "positions")).mkdir(parents=True, exist_ok=True)
+    return path.join(basePath, "positions", f"{callsign}.bin")
+
+def buildFilter(callsigns):
+    # Budlist filter, callsigns may use * wildcards the same way the server does
+    return "b/" + "/".join(callsigns)
+
+def isTracked(callsign, callsigns):
+    return any(fnmatch.fnmatchcase(callsign, pattern) for pattern in callsigns)
+
+def handlePacket(packet, callsigns):
+    perfLog.addBytes(len(packet))
+    try:
+        with perfLog.stage("parse"):
+            packet = aprslib.parse(packet)
+    except (aprslib.ParseError, aprslib.UnknownFormat):
+        return
+    if not isTracked(packet["from"], callsigns) or "latitude" not in packet:
+        return
+    print(packet["path"])
+    newData = pd.DataFrame({"lat": [packet["latitude"]], "lon": [packet["longitude"]], "deltaLat": [0], "deltaLon": [0], "type": ["APRS"]}, index=[dt.utcnow()])
+    with perfLog.stage("storeAppend"):
+        positionStore.append(newData, storePathForCallsign(packet["from"]))
+    perfLog.emit("tascAPRS", callsign=packet["from"])
+
+async def ingest(callsigns):
+    # One long-lived filtered connection, reconnecting with exponential backoff
+    loop = asyncio.get_running_loop()
+    login = f"user {loginCallsign} pass -1 vers hdwx-tasc 1.0 filter {buildFilter(callsigns)}\r\n"
+    backoff = 1
+    while True:
+        writer = None
+        connectedAt = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(aprsServer, aprsPort), timeout=readTimeout)
+            connectedAt = loop.time()
+            writer.write(login.encode())
+            await writer.drain()
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=readTimeout)
+                if not line:
+                    raise ConnectionError("APRS-IS server closed the connection")
+                if line.startswith(b"#"):
+                    continue
+                # Parsing and the store append block, keep them off the event loop
+                try:
+                    await loop.run_in_executor(None, handlePacket, line.rstrip(b"\r\n"), callsigns)
+                except Exception as e:
+                    # One bad packet or a failed append (disk full) shouldn't drop the connection
+                    print(f"Failed to handle APRS packet: {e}")
+        except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+            # A server that accepts the login and then drops us straight away keeps backing off
+            if connectedAt is not None and loop.time() - connectedAt > stableConnection:
+                backoff = 1
+            print(f"APRS-IS connection lost ({e}), reconnecting in {backoff} seconds")
+        finally:
+            if writer is not None:
+                writer.close()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, maxBackoff)
+
 
 if __name__ == "__main__":
-    AIS = aprslib.IS("WX5AGS")
-    AIS.connect()
-    AIS.consumer(callback, raw=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Track APRS callsigns into the position store")
+    parser.add_argument("callsigns", nargs="*", default=defaultCallsigns, help="callsigns to track, * wildcards allowed")
+    args = parser.parse_args()
+    asyncio.run(ingest(args.callsigns))
@@ -2,48 +2,60 @@
 # Plots TASC location data
 # Created 24 October 2022 by Sam Gardner <stgardner4@tamu.edu>
 
-from os import path, remove, listdir
-from pathlib import Path
-import shutil
-import gzip
-import pandas as pd
+import perfLog
+from os import path
 from matplotlib import pyplot as plt
 from matplotlib import colors as pltcolors
 from matplotlib.patches import Rectangle
+from matplotlib.collections import LineCollection
 from cartopy import crs as ccrs
-from cartopy import feature as cfeat
-from metpy import plots as mpplots
 import numpy as np
-import xarray as xr
 import pyart
 from datetime import datetime as dt, timedelta
-import requests
 import sys
+from time import sleep
+import basemapCache
+import positionStore
+import mrmsCache
+import rasterLayer
+import frameOutput
+import gisTiles
 
 basePath = path.dirname(path.abspath(__file__))
 hasHelpers = False
 if path.exists(path.join(basePath, "HDWX_helpers.py")):
     import HDWX_helpers
     hasHelpers = True
+perfLog.mark("import")
 
-def addMRMSToFig(fig, ax, mrmsGribName, axExtent, time, targetLat, targetLon):
-    datasetFilePath = path.join(basePath, "radarInput", mrmsGribName)
-    radarDS = xr.open_dataset(datasetFilePath)
-    radarDS = radarDS.sel(latitude=slice(axExtent[3], axExtent[2]), longitude=slice(axExtent[0]+360, axExtent[1]+360))
-    radarData = np.ma.masked_array(radarDS.unknown.data, mask=np.where(radarDS.unknown.data > 10, 0, 1))
-    cmap = "pyart_ChaseSpectral"
-    vmin=-10
-    vmax=80
-    rdr = ax.pcolormesh(radarDS.longitude, radarDS.latitude, radarData, cmap=cmap, vmin=vmin, vmax=vmax, transform=ccrs.PlateCarree(), zorder=5, alpha=0.5)
+def addMRMSToFig(fig, ax, axExtent, time, targetLat, targetLon, mrmsTime=None):
+    # mrmsTime of None uses the newest scan available, returns the metadata frame for product 191
+    with perfLog.stage("mrmsFetch"):
+        radarSubset = mrmsCache.getSubset(axExtent, mrmsTime)
+    rdr = None
+    notice = "WSPR data courtesy of wsprnet.org"
+    if radarSubset is not None:
+        radarLons, radarLats, radarValues, _ = radarSubset
+        with perfLog.stage("mrmsRegrid"):
+            targetExtent = ax.get_extent()
+            radarData = rasterLayer.regrid(radarValues, ccrs.PlateCarree(), np.where(radarLons > 180, radarLons - 360, radarLons), radarLats, ax.projection, targetExtent)
+            rasterLayer.maskAtOrBelow(radarData, 10)
+        cmap = "pyart_ChaseSpectral"
+        vmin=-10
+        vmax=80
+        with perfLog.stage("imshow"):
+            rdr = rasterLayer.drawRaster(ax, radarData, targetExtent, cmap=cmap, vmin=vmin, vmax=vmax, zorder=5, alpha=0.5)
+        notice = "MRMS data provided by NOAA/NSSL. " + notice
+    else:
+        print(f"No MRMS scan close to {mrmsTime}, rendering without radar")
     runPathExtension = path.join(time.strftime("%Y"), time.strftime("%m"), time.strftime("%d"), "0000")
-    Path(path.join(basePath, "output", "products", "tasc", "rala", runPathExtension)).mkdir(parents=True, exist_ok=True)
     if hasHelpers:
-        HDWX_helpers.dressImage(fig, ax, f"TASC Location: {targetLat:.2f}, {targetLon:.2f} + MRMS Reflectivity", time, notice="MRMS data provided by NOAA/NSSL. WSPR data courtesy of wsprnet.org", plotHandle=rdr, colorbarLabel="Reflectivity (dBZ)")
-        HDWX_helpers.saveImage(fig, path.join(basePath, "output", "products", "tasc", "rala", runPathExtension, time.strftime("%H%M.png")))
-        HDWX_helpers.writeJson(basePath, 191, time.replace(hour=0), time.strftime("%H%M.png"), time, ["0,0", "0,0"], 60)
-    else:
-        fig.savefig(path.join(basePath, "output", "products", "tasc", "rala", runPathExtension, time.strftime("%H%M.png")))
+        with perfLog.stage("dressImage"):
+            HDWX_helpers.dressImage(fig, ax, f"TASC Location: {targetLat:.2f}, {targetLon:.2f} + MRMS Reflectivity", time, notice=notice, plotHandle=rdr, colorbarLabel="Reflectivity (dBZ)")
+    with perfLog.stage("saveImage"):
+        frameOutput.saveImage(fig, path.join(basePath, "output", "products", "tasc", "rala", runPathExtension, time.strftime("%H%M.png")))
     plt.close(fig)
+    return (191, time.replace(hour=0), time.strftime("%H%M.png"), time, ["0,0", "0,0"], 60)
 
 def plotTASC(ax, timeToPlot, data):
     infoToPlot = data.loc[timeToPlot]
@@ -57,81 +69,153 @@ def plotTASC(ax, timeToPlot, data):
         ax.add_patch(rect2)
     return targetLon, targetLat
 
-def plotTrail(ax, lats, lons):
+def buildTrail(lats, lons, pointsPerSegment=100):
+    # Interpolates every trail segment at once and projects to web mercator, returns line segments and their 0-1 color values
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
     totalIdx = len(lats)-1
-    for i in range(totalIdx):
-        startLat = lats[i]
-        startLon = lons[i]
-        endLat = lats[i+1]
-        endLon = lons[i+1]
-        latsToPlot = np.linspace(startLat, endLat, 1000)
-        lonsToPlot = np.linspace(startLon, endLon, 1000)
-        colors = np.linspace((i/totalIdx), ((i+1)/totalIdx), 1000)
-        ax.scatter(lonsToPlot, latsToPlot, s=1, c=colors, vmin=0, vmax=1, cmap="plasma_r", edgecolor=None, transform=ccrs.PlateCarree(), zorder=7)
+    if totalIdx < 1:
+        return np.zeros((0, 2, 2)), np.zeros(0)
+    fractions = np.linspace(0, 1, pointsPerSegment+1)
+    segLats = lats[:-1, np.newaxis] + (lats[1:] - lats[:-1])[:, np.newaxis] * fractions
+    segLons = lons[:-1, np.newaxis] + (lons[1:] - lons[:-1])[:, np.newaxis] * fractions
+    projected = ccrs.epsg(3857).transform_points(ccrs.PlateCarree(), segLons.ravel(), segLats.ravel())[:, 0:2].reshape(totalIdx, pointsPerSegment+1, 2)
+    segments = np.stack([projected[:, :-1], projected[:, 1:]], axis=2).reshape(-1, 2, 2)
+    colors = ((np.arange(totalIdx)[:, np.newaxis] + (fractions[:-1] + fractions[1:])/2) / totalIdx).ravel()
+    return segments, colors
 
-if __name__ == "__main__":
-    if not path.exists(path.join(basePath, "tascLoc.csv")):
-        exit()
-    tascLoc = pd.read_csv(path.join(basePath, "tascLoc.csv"), index_col=0)
-    tascLoc.index = pd.to_datetime(tascLoc.index)
-    lastTime = tascLoc.index[-1]
+def plotTrail(ax, lats, lons):
+    # ax must be in EPSG:3857, the segments are already projected so cartopy doesn't transform them again
+    segments, colors = buildTrail(lats, lons)
+    if len(segments) == 0:
+        return None
+    trail = LineCollection(segments, array=colors, cmap="plasma_r", norm=pltcolors.Normalize(vmin=0, vmax=1), linewidths=1, capstyle="round", zorder=7)
+    ax.add_collection(trail, autolim=False)
+    return segments
+
+def renderTileFrame(tascLoc, lastTime, trailLats, trailLons):
+    # Draws the position, uncertainty box and trail straight in web mercator on a bare 256px axes and writes only the tiles they touch
+    fig, ax = gisTiles.getTileAxes()
+    infoToPlot = tascLoc.loc[lastTime]
+    cornerLons = np.array([infoToPlot["lon"], infoToPlot["lon"] + infoToPlot["deltaLon"]/2, infoToPlot["lon"] + infoToPlot["deltaLon"]])
+    cornerLats = np.array([infoToPlot["lat"], infoToPlot["lat"] + infoToPlot["deltaLat"]/2, infoToPlot["lat"] + infoToPlot["deltaLat"]])
+    corners = ccrs.epsg(3857).transform_points(ccrs.PlateCarree(), cornerLons, cornerLats)[:, 0:2]
+    ax.scatter(corners[1, 0], corners[1, 1], s=15, linewidths=0.75, color="yellow", edgecolor="black", zorder=10)
+    if infoToPlot["deltaLat"] != 0 and infoToPlot["deltaLon"] != 0:
+        width, height = corners[2] - corners[0]
+        ax.add_patch(Rectangle(corners[0], width, height, facecolor="None", edgecolor="black", zorder=9))
+        ax.add_patch(Rectangle(corners[0], width, height, facecolor="black", edgecolor="black", zorder=9, alpha=0.2))
+    segments = plotTrail(ax, trailLats, trailLons)
+    # Mercator keeps lat/lon boxes axis aligned, so the corners bound the point and the uncertainty box
+    xMins = [corners[:, 0].min()]
+    xMaxs = [corners[:, 0].max()]
+    yMins = [corners[:, 1].min()]
+    yMaxs = [corners[:, 1].max()]
+    if segments is not None:
+        xMins = np.concatenate([xMins, segments[:, :, 0].min(axis=1)])
+        xMaxs = np.concatenate([xMaxs, segments[:, :, 0].max(axis=1)])
+        yMins = np.concatenate([yMins, segments[:, :, 1].min(axis=1)])
+        yMaxs = np.concatenate([yMaxs, segments[:, :, 1].max(axis=1)])
+    frameDir = path.join(lastTime.strftime("%Y"), lastTime.strftime("%m"), lastTime.strftime("%d"), lastTime.strftime("%H%M"))
+    outputDir = path.join(basePath, "output", "gisproducts", "tasc", "tiles", frameDir)
+    writtenTiles = gisTiles.renderTiles(fig, ax, (xMins, xMaxs, yMins, yMaxs), outputDir)
+    manifest = {
+        "valid" : lastTime.strftime("%Y%m%d%H%M"),
+        "position" : [infoToPlot["lat"] + infoToPlot["deltaLat"]/2, infoToPlot["lon"] + infoToPlot["deltaLon"]/2],
+        "tileSize" : gisTiles.tilePixels,
+        "url" : "{z}/{x}/{y}.png",
+        "tiles" : writtenTiles
+    }
+    frameOutput.saveJson(manifest, path.join(outputDir, "manifest.json"))
+    return path.join(frameDir, "manifest.json")
+
+def readTascLoc():
+    with perfLog.stage("positionRead"):
+        tascLoc = positionStore.readDataFrame(start=dt.utcnow() - positionStore.maxAge)
+    if len(tascLoc) == 0:
+        return None
+    return tascLoc
+
+def frameExists(lastTime):
+    filenameToSave = lastTime.strftime("%H%M") + ".png"
+    return path.exists(path.join(basePath, "output", "products", "tasc", "rala", lastTime.strftime("%Y"), lastTime.strftime("%m"), lastTime.strftime("%d"), "0000", filenameToSave))
+
+def renderFrame(tascLoc, lastTime, shouldGIS=True, now=None, mrmsTime=None, writeMetadata=True, tiles=False):
+    # now and mrmsTime let backfill render past frames, metadata frames are returned instead of written when writeMetadata is False
+    # tiles swaps the full-frame GIS PNG for XYZ tiles plus a per-frame manifest
+    metadataFrames = []
     filenameToSave = lastTime.strftime("%H%M") + ".png"
-    if path.exists(path.join(basePath, "output", "products", "tasc", "rala", lastTime.strftime("%Y"), lastTime.strftime("%m"), lastTime.strftime("%d"), "0000", filenameToSave)):
-        exit()
     fig = plt.figure()
     ax = plt.axes(projection=ccrs.epsg(3857))
     targetLon = 0
     targetLat = 0
-    targetLon, targetLat = plotTASC(ax, lastTime, tascLoc)
-    trailLats = []
-    trailLons = []
-    cutOffTime = dt.utcnow() - timedelta(minutes=15)
-    for time, data in tascLoc.iloc[::-1].iterrows():
-        if time > cutOffTime:
-            if data["deltaLat"] == 0:
-                trailLats.append(data["lat"])
-                trailLons.append(data["lon"])
-        else:
-            break
-    plotTrail(ax, trailLats, trailLons)
+    with perfLog.stage("positionDraw"):
+        targetLon, targetLat = plotTASC(ax, lastTime, tascLoc)
+        cutOffTime = (dt.utcnow() if now is None else now) - timedelta(minutes=15)
+        trailData = tascLoc[(tascLoc.index > cutOffTime) & (tascLoc["deltaLat"] == 0)].iloc[::-1]
+        plotTrail(ax, trailData["lat"].values, trailData["lon"].values)
     ax.set_extent([targetLon - 0.5, targetLon + 0.5, targetLat - 0.5, targetLat + 0.5], crs=ccrs.PlateCarree())
     ax.set_box_aspect(9/16)
-    roads = cfeat.NaturalEarthFeature("cultural", "roads_north_america", "10m", facecolor="none")
-    ax.add_feature(roads, edgecolor="red", linewidth=0.25, zorder=3)
-    ax.add_feature(mpplots.USCOUNTIES.with_scale("5m"), edgecolor="green", linewidth=0.25, zorder=2)
     px = 1/plt.rcParams["figure.dpi"]
     fig.set_size_inches(1920*px, 1080*px)
-    if "--no-gis" not in sys.argv:
+    with perfLog.stage("basemap"):
+        basemapCache.addBasemapToAx(ax)
+    point1 = ccrs.PlateCarree().transform_point(ax.get_extent()[0], ax.get_extent()[2], ccrs.epsg(3857))
+    point2 = ccrs.PlateCarree().transform_point(ax.get_extent()[1], ax.get_extent()[3], ccrs.epsg(3857))
+    if shouldGIS and tiles:
+        with perfLog.stage("gisTiles"):
+            manifestPath = renderTileFrame(tascLoc, lastTime, trailData["lat"].values, trailData["lon"].values)
+        if writeMetadata:
+            frameOutput.saveJson({"valid" : lastTime.strftime("%Y%m%d%H%M"), "manifest" : manifestPath}, path.join(basePath, "output", "gisproducts", "tasc", "tiles", "latest.json"))
+    elif shouldGIS:
         pathToSave = path.join(basePath, "output", "gisproducts", "tasc", lastTime.strftime("%Y"), lastTime.strftime("%m"), lastTime.strftime("%d"), lastTime.strftime("0000"), filenameToSave)
-        extent = ax.get_tightbbox(fig.canvas.get_renderer()).transformed(fig.dpi_scale_trans.inverted())
-        Path(path.dirname(pathToSave)).mkdir(exist_ok=True, parents=True)
-        point1 = ccrs.PlateCarree().transform_point(ax.get_extent()[0], ax.get_extent()[2], ccrs.epsg(3857))
-        point2 = ccrs.PlateCarree().transform_point(ax.get_extent()[1], ax.get_extent()[3], ccrs.epsg(3857))
-        gisInfo = [str(point1[1])+","+str(point1[0]), str(point2[1])+","+str(point2[0])]
-        if hasHelpers:
-            HDWX_helpers.saveImage(fig, pathToSave, transparent=True, bbox_inches=extent)
-            HDWX_helpers.writeJson(basePath, 190, lastTime.replace(hour=0), filenameToSave, lastTime, gisInfo, 60)
-        else:
-            fig.savefig(pathToSave, transparent=True, bbox_inches=extent)
+        with perfLog.stage("gisSaveImage"):
+            extent = ax.get_tightbbox(fig.canvas.get_renderer()).transformed(fig.dpi_scale_trans.inverted())
+            gisInfo = [str(point1[1])+","+str(point1[0]), str(point2[1])+","+str(point2[0])]
+            frameOutput.saveImage(fig, pathToSave, transparent=True, bbox_inches=extent)
+        metadataFrames.append((190, lastTime.replace(hour=0), filenameToSave, lastTime, gisInfo, 60))
+    metadataFrames.append(addMRMSToFig(fig, ax, [point1[0], point2[0], point1[1], point2[1]], lastTime, targetLat, targetLon, mrmsTime))
+    if writeMetadata:
+        with perfLog.stage("writeJson"):
+            writeMetadataFrames(metadataFrames)
+    perfLog.emit("tascPlot", frame=lastTime.strftime("%Y%m%d%H%M"))
+    return metadataFrames
+
+def writeMetadataFrames(metadataFrames):
+    for metadataFrame in metadataFrames:
+        frameOutput.writeMetadata(*metadataFrame)
 
-    gribList = pd.read_html("https://mrms.ncep.noaa.gov/data/2D/ReflectivityAtLowestAltitude/")[0].dropna(how="any")
-    gribList = gribList[~gribList.Name.str.contains("latest") == True].reset_index()
-    gribList["pyDateTimes"] = [dt.strptime(filename, "MRMS_ReflectivityAtLowestAltitude_00.50_%Y%m%d-%H%M%S.grib2.gz") for filename in gribList["Name"]]
-    gribList = gribList.set_index(["pyDateTimes"])
-    latestRadarGrib = gribList["Name"].iloc[-1]
-    if not path.exists(path.join(basePath, latestRadarGrib.replace(".gz", ""))):
-        [remove(path.join(basePath, oldRadarFile)) for oldRadarFile in listdir(basePath) if oldRadarFile.endswith(".grib2.gz")]
-        [remove(path.join(basePath, oldRadarFile)) for oldRadarFile in listdir(basePath) if oldRadarFile.endswith(".grib2")]
-        urlToFetch = "https://mrms.ncep.noaa.gov/data/2D/ReflectivityAtLowestAltitude/"+latestRadarGrib
-        mrmsData = requests.get(urlToFetch)
-        output = path.join(basePath, latestRadarGrib)
-        if mrmsData.status_code == 200:
-            with open(output, "wb") as fileWrite:
-                fileWrite.write(mrmsData.content)
-            with gzip.open(output, "rb") as f_in:
-                with open(output.replace(".gz", ""), "wb") as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-            remove(output)
-    addMRMSToFig(fig, ax, path.join(basePath, latestRadarGrib.replace(".gz", "")), [point1[0], point2[0], point1[1], point2[1]], lastTime, targetLat, targetLon)
-    [remove(path.join(basePath, oldRadarFile)) for oldRadarFile in listdir(basePath) if oldRadarFile.endswith(".idx")]
-    
\ No newline at end of file
+def runDaemon(shouldGIS=True, pollInterval=5, tiles=False):
+    # Keeps imports, projections and the basemap tile cache warm, only renders when the position store gets a new fix
+    tascLocPath = positionStore.defaultStorePath
+    positionStore.migrateLegacyCSV()
+    lastMtime = None
+    while True:
+        if path.exists(tascLocPath):
+            thisMtime = path.getmtime(tascLocPath)
+            if thisMtime != lastMtime:
+                try:
+                    tascLoc = readTascLoc()
+                    if tascLoc is not None:
+                        lastTime = tascLoc.index[-1]
+                        if not frameExists(lastTime):
+                            renderFrame(tascLoc, lastTime, shouldGIS, tiles=tiles)
+                    # Only marked done once rendered, a failed fix is retried on the next poll
+                    lastMtime = thisMtime
+                except Exception as e:
+                    print(f"Failed to render TASC frame, retrying in {pollInterval} seconds: {e}")
+                    plt.close("all")
+        sleep(pollInterval)
+
+if __name__ == "__main__":
+    shouldGIS = "--no-gis" not in sys.argv
+    tiles = "--tiles" in sys.argv
+    if "--daemon" in sys.argv:
+        runDaemon(shouldGIS, tiles=tiles)
+    tascLoc = readTascLoc()
+    if tascLoc is None:
+        exit()
+    lastTime = tascLoc.index[-1]
+    if frameExists(lastTime):
+        exit()
+    renderFrame(tascLoc, lastTime, shouldGIS, tiles=tiles)
@@ -2,70 +2,125 @@
 # Fetches TASC location from WSPR
 # Created 24 October 2022 by Sam Gardner <stgardner4@tamu.edu>
 
+import perfLog
 import pandas as pd
+import numpy as np
 import requests
-import maidenhead as mh
-from os import path, system, remove
+from os import path, replace, environ
 from datetime import datetime as dt, timedelta
-import pytz
 from time import sleep
-import atexit
+import math
 import json
+import positionStore
 
 basePath = path.dirname(path.realpath(__file__))
-updateWait = 1800
+perfLog.mark("import")
+# Can point at a local fixture server with the same /rest/user/login and /wsprnet/spots/json/ routes
+wsprURL = environ.get("HDWX_WSPR_URL", "https://www.wsprnet.org/drupal")
+wsprCallsign = "WX5AGS"
+cursorPath = path.join(basePath, "wsprCursor.txt")
+# The spots endpoint is asked for at most this many minutes of history
+maxWindowMinutes = 45
+rapidWait = 150
+idleWait = 1800
+wsprSession = None
 
-@atexit.register
-def exitFunc():
-    print(f"waiting {updateWait} seconds before exiting")
-    sleep(updateWait)
 
+def maidenheadToLocation(grids):
+    # Vectorized maidenhead decode, returns the southwest corner lat/lon and the cell height/width in degrees
+    grids = pd.Series(grids, dtype=str).str.upper()
+    lengths = grids.str.len().values
+    chars = np.frombuffer(grids.str.ljust(8, "0").str.slice(0, 8).str.cat().encode("ascii"), dtype=np.uint8).reshape(-1, 8).astype(np.float64)
+    lons = (chars[:, 0] - ord("A")) * 20 - 180
+    lats = (chars[:, 1] - ord("A")) * 10 - 90
+    deltaLons = np.full(len(grids), 20.0)
+    deltaLats = np.full(len(grids), 10.0)
+    # Each pair of characters divides the previous cell: 10x10 digits, 24x24 letters, 10x10 digits
+    for pairIdx, (divisions, base) in enumerate([(10, ord("0")), (24, ord("A")), (10, ord("0"))]):
+        hasPair = lengths >= 4 + 2*pairIdx
+        deltaLons = np.where(hasPair, deltaLons / divisions, deltaLons)
+        deltaLats = np.where(hasPair, deltaLats / divisions, deltaLats)
+        lons = np.where(hasPair, lons + (chars[:, 2 + 2*pairIdx] - base) * deltaLons, lons)
+        lats = np.where(hasPair, lats + (chars[:, 3 + 2*pairIdx] - base) * deltaLats, lats)
+    return lats, lons, deltaLats, deltaLons
 
-def fetchWSPR():
+def decodeSpots(spots):
+    spotsDF = pd.DataFrame(spots, columns=["Date", "Grid"])
+    spotTimes = pd.to_datetime(spotsDF["Date"].astype(np.int64), unit="s")
+    lats, lons, deltaLats, deltaLons = maidenheadToLocation(spotsDF["Grid"])
+    types = spotsDF["Grid"].str.len().astype(str) + "-character maidenhead"
+    return pd.DataFrame({"lat": lats, "lon": lons, "deltaLat": deltaLats, "deltaLon": deltaLons, "type": types.values}, index=spotTimes.values)
+
+def readCursor():
+    if path.exists(cursorPath):
+        with open(cursorPath, "r") as f:
+            return dt.utcfromtimestamp(int(f.read().strip()))
+    return None
+
+def writeCursor(cursor):
+    with open(cursorPath + ".tmp", "w") as f:
+        f.write(str(int((cursor - dt(1970, 1, 1)).total_seconds())))
+    replace(cursorPath + ".tmp", cursorPath)
+
+def login():
+    global wsprSession
     wsprSession = requests.Session()
     passwd = open(path.join(basePath, "wsprPasswd.txt"), 'r').read().strip()
-    login = wsprSession.post("https://www.wsprnet.org/drupal/rest/user/login", json={"name": "wx4stg", "pass" : passwd})
-    spotsRes = wsprSession.post("https://www.wsprnet.org/drupal/wsprnet/spots/json/", cookies=login.cookies, data={"callsign": "WX5AGS", "band" : "All", "minutes": 45})
-    spots = json.loads(spotsRes.text)
+    with perfLog.stage("login"):
+        wsprSession.post(wsprURL + "/rest/user/login", json={"name": "wx4stg", "pass" : passwd}).raise_for_status()
+
+def fetchSpots(minutes):
+    # Logs in on first use and again if the session has expired
+    for attempt in range(2):
+        if wsprSession is None:
+            login()
+        with perfLog.stage("spotsFetch"):
+            spotsRes = wsprSession.post(wsprURL + "/wsprnet/spots/json/", data={"callsign": wsprCallsign, "band" : "All", "minutes": minutes})
+            perfLog.addBytes(len(spotsRes.content))
+        if spotsRes.status_code in [401, 403] and attempt == 0:
+            login()
+            continue
+        spotsRes.raise_for_status()
+        return json.loads(spotsRes.text)
+    return []
+
+def fetchWSPR(cursor):
+    # Only ingests spots newer than cursor, returns the new cursor
+    minutes = maxWindowMinutes
+    if cursor is not None:
+        minutes = max(1, min(maxWindowMinutes, math.ceil((dt.utcnow() - cursor).total_seconds()/60) + 1))
+    spots = fetchSpots(minutes)
     if len(spots) == 0:
-        return
-    global updateWait
-    updateWait = 150
-    datetimes = []
-    lats = []
-    lons = []
-    deltaLats = []
-    deltaLons = []
-    types = []
-    for spot in spots:
-        thisDate = pytz.timezone("US/Central").localize(dt.fromtimestamp(int(spot["Date"])), is_dst=None).astimezone(pytz.utc).replace(tzinfo=None)
-        thisLat, thisLon = mh.to_location(spot["Grid"])
-        thisLatC, thisLonC = mh.to_location(spot["Grid"], center=True)
-        thisLatDelta = 2*(thisLatC - thisLat)
-        thisLonDelta = 2*(thisLonC - thisLon)
-        datetimes.append(thisDate)
-        lats.append(thisLat)
-        lons.append(thisLon)
-        deltaLats.append(thisLatDelta)
-        deltaLons.append(thisLonDelta)
-        types.append(f"{len(spot['Grid'])}-character maidenhead")
-    newData = pd.DataFrame({"lat": lats, "lon": lons, "deltaLat": deltaLats, "deltaLon": deltaLons, "type": types}, index=datetimes)
-    if path.exists(path.join(basePath, "tascLoc.csv")):
-        oldData = pd.read_csv(path.join(basePath, "tascLoc.csv"), index_col=0)
-        oldData.index = pd.to_datetime(oldData.index)
-        newData = pd.concat([oldData, newData])
-    newData = newData[~newData.index.duplicated(keep="first")]
-    cutOffTime = dt.utcnow() - timedelta(days=1)
-    newData = newData[newData.index > cutOffTime]
-    newData = newData.sort_index()
-    newData.to_csv(path.join(basePath, "tascLoc.csv"))
+        perfLog.emit("tascWSPR", spots=0)
+        return cursor
+    with perfLog.stage("decode"):
+        newData = decodeSpots(spots)
+        if cursor is not None:
+            newData = newData[newData.index > cursor]
+    if len(newData) > 0:
+        with perfLog.stage("storeAppend"):
+            positionStore.append(newData)
+        cursor = newData.index.max().to_pydatetime()
+        writeCursor(cursor)
+    perfLog.emit("tascWSPR", spots=len(spots), newSpots=len(newData))
+    return cursor
+
+def pollForever():
+    cursor = readCursor()
+    while True:
+        # Anything going wrong (network, a missing password file, a full disk) waits out the normal poll
+        # interval and tries again, rather than exiting into a systemd restart loop
+        updateWait = idleWait
+        try:
+            cursor = fetchWSPR(cursor)
+            lastDt = positionStore.lastTime()
+            if lastDt is not None and lastDt > dt.utcnow() - timedelta(minutes=maxWindowMinutes):
+                updateWait = rapidWait
+        except Exception as e:
+            print(f"WSPR fetch failed: {e}")
+            updateWait = rapidWait
+        print(f"waiting {updateWait} seconds before polling again")
+        sleep(updateWait)
 
 if __name__ == "__main__":
-    if path.exists(path.join(basePath, "tascLoc.csv")):
-        oldData = pd.read_csv(path.join(basePath, "tascLoc.csv"), index_col=0)
-        oldData.index = pd.to_datetime(oldData.index)
-        lastDt = oldData.index[-1]
-        if lastDt > dt.utcnow() - timedelta(minutes=45):
-            updateWait = 150
-            print("Starting rapid update cycle")
-    fetchWSPR()
\ No newline at end of file
+    pollForever()